@@ -0,0 +1 @@
+# Benchmark and load-test suite for the backend API (see benchmarks/run.py)
@@ -0,0 +1,87 @@
+"""
+Deterministic synthetic rewards databases for benchmarks.
+
+Datasets are generated from a fixed seed so two runs on different machines
+measure the same data, and are cached on disk because the 1M-user file takes
+a while to build.
+"""
+from datetime import datetime, timedelta
+import os
+import random
+
+import checkpoint
+from routers.rewards import ACTION_POINTS, BADGE_DEFINITIONS, STATS_FIELD, calculate_rank, stats_from_actions
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+DEFAULT_SEED = 1234
+DEFAULT_ACTIONS_PER_USER = 5
+
+_EPOCH = datetime(2024, 1, 1)
+
+
+def parse_size(label: str) -> int:
+    label = label.strip().lower()
+    if label in SIZES:
+        return SIZES[label]
+    if label.endswith("k"):
+        return int(float(label[:-1]) * 1_000)
+    if label.endswith("m"):
+        return int(float(label[:-1]) * 1_000_000)
+    return int(label)
+
+
+def user_id_for(index: int) -> str:
+    return f"bench-user-{index:07d}"
+
+
+def generate_user(rng: random.Random, actions_per_user: int) -> dict:
+    action_types = list(ACTION_POINTS)
+    badge_ids = list(BADGE_DEFINITIONS)
+    created = _EPOCH + timedelta(seconds=rng.randrange(0, 180 * 86400))
+    actions = []
+    points = 0
+    for i in range(rng.randint(0, actions_per_user * 2)):
+        action_type = rng.choice(action_types)
+        amount = round(rng.uniform(0.5, 5.0), 2)
+        earned = int(ACTION_POINTS[action_type] * amount)
+        points += earned
+        actions.append({
+            "type": action_type,
+            "amount": amount,
+            "points_earned": earned,
+            "timestamp": (created + timedelta(minutes=i * 37)).isoformat(),
+            "metadata": {}
+        })
+    points += rng.randrange(0, 2000)
+    updated = actions[-1]["timestamp"] if actions else created.isoformat()
+    return {
+        "ecoPoints": points,
+        "badges": rng.sample(badge_ids, rng.randint(0, 3)),
+        "rank": calculate_rank(points),
+        "actions": actions[-100:],
+        STATS_FIELD: stats_from_actions(actions),
+        "created_at": created.isoformat(),
+        "updated_at": updated
+    }
+
+
+def generate_db(users: int, seed: int = DEFAULT_SEED, actions_per_user: int = DEFAULT_ACTIONS_PER_USER) -> dict:
+    rng = random.Random(seed)
+    return {user_id_for(i): generate_user(rng, actions_per_user) for i in range(users)}
+
+
+def dataset_path(cache_dir: str, users: int, seed: int, actions_per_user: int) -> str:
+    return os.path.join(cache_dir, f"rewards_db-{users}-s{seed}-a{actions_per_user}.json")
+
+
+def ensure_dataset(cache_dir: str, users: int, seed: int = DEFAULT_SEED,
+                   actions_per_user: int = DEFAULT_ACTIONS_PER_USER) -> str:
+    """Build (or reuse) a cached dataset file and return its path"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = dataset_path(cache_dir, users, seed, actions_per_user)
+    if not os.path.exists(path):
+        db = generate_db(users, seed, actions_per_user)
+        # Same layout save_rewards_db produces
+        checkpoint.atomic_write(path, checkpoint.serialize_db(db))
+    return path
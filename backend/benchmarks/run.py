@@ -0,0 +1,436 @@
+"""
+Reproducible benchmark and load-test runner for the backend API.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --sizes 1k,100k --mode all --output bench-results.json
+    python -m benchmarks.run --sizes 1k,100k,1m --mode all --output benchmarks/baseline.json
+    python -m benchmarks.run --sizes 1k,100k,1m --baseline benchmarks/baseline.json --fail-on-regression
+
+Baselines are machine-specific: record one on the machine that runs the
+comparison (see README "Benchmarks").
+
+Modes:
+    inprocess  call the route functions directly (no HTTP, no middleware)
+    http       start uvicorn on a local port and drive it with a concurrent
+               keep-alive load generator
+    storage    run one workload against each rewards storage backend
+               (`--backends memory,file`), one `store-<backend>` mode per backend
+
+Every (size, mode, operation) row reports iterations, throughput (ops/s) and
+p50/p99/mean latency in milliseconds. With --baseline, rows are compared to a
+stored results file and regressions beyond --tolerance are listed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import datagen
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "carbonx-bench-data")
+
+
+# -------------------------
+# Statistics
+# -------------------------
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(size_label, mode, op, latencies, elapsed, errors=0, concurrency=1) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "size": size_label,
+        "mode": mode,
+        "op": op,
+        "concurrency": concurrency,
+        "iterations": count,
+        "errors": errors,
+        "throughput_ops": round(count / elapsed, 3) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+    }
+
+
+def _measure(func, duration: float, min_iterations: int, max_iterations: int):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    while len(latencies) < max_iterations:
+        t0 = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+        if len(latencies) >= min_iterations and time.perf_counter() - start >= duration:
+            break
+    return latencies, time.perf_counter() - start, errors
+
+
+# -------------------------
+# In-process benchmarks
+# -------------------------
+def run_inprocess(size_label, users, dataset, workdir, args):
+    import main
+    from routers import credits, rewards
+
+    db_path = os.path.join(workdir, "rewards_db.json")
+    shutil.copyfile(dataset, db_path)
+    original_db_file = rewards.REWARDS_DB_FILE
+    rewards.REWARDS_DB_FILE = db_path
+    rewards.invalidate_rewards_cache()
+    rng = random.Random(args.seed)
+    action_types = list(rewards.ACTION_POINTS)
+
+    def random_user():
+        return datagen.user_id_for(rng.randrange(users))
+
+    def update():
+        req = rewards.UpdateRewardsRequest(user_id=random_user(), action_type=rng.choice(action_types), amount=1.0)
+        rewards.update_rewards(req)
+
+    ops = [
+        ("get_leaderboard", lambda: rewards.get_leaderboard(limit=100)),
+        ("get_user_rewards_data", lambda: rewards.get_user_rewards_data(random_user())),
+        ("ready", main.ready),
+        ("credits_price", credits.get_price),
+        ("credits_trade", lambda: credits.trade(credits.TradeRequest(amount=10, action="buy"))),
+        # Writes last so reads measure the generated dataset
+        ("update_rewards", update),
+    ]
+    try:
+        results = []
+        for name, func in ops:
+            if args.ops and name not in args.ops:
+                continue
+            func()  # warm-up: first load parses the file
+            latencies, elapsed, errors = _measure(func, args.duration, args.min_iterations, args.max_iterations)
+            results.append(summarize(size_label, "inprocess", name, latencies, elapsed, errors))
+            _progress(results[-1])
+        return results
+    finally:
+        rewards.REWARDS_DB_FILE = original_db_file
+        rewards.invalidate_rewards_cache()
+
+
+# -------------------------
+# Storage backends
+# -------------------------
+def run_storage(size_label, users, dataset, workdir, args):
+    """The same workload against each storage backend, through the RewardsStore contract"""
+    import storage
+    from routers import rewards
+
+    with open(dataset, "rb") as f:
+        data = json.load(f)
+    action = {"type": "calculator_use", "amount": 1.0, "points_earned": 10, "timestamp": "2024-06-01T00:00:00", "metadata": {}}
+
+    results = []
+    for backend in args.backends:
+        if backend == "file":
+            db_path = os.path.join(workdir, "rewards_db.json")
+            shutil.copyfile(dataset, db_path)
+            store = storage.FileStore(lambda: db_path)
+        else:
+            store = storage.MemoryStore(data)
+        rng = random.Random(args.seed)
+
+        def random_user():
+            return datagen.user_id_for(rng.randrange(users))
+
+        def put_user():
+            user_id = random_user()
+            store.put_user(user_id, store.get_user(user_id))
+
+        ops = [
+            ("store_get_user", lambda: store.get_user(random_user())),
+            ("store_position", lambda: store.position(random_user())),
+            ("store_top", lambda: store.top(100)),
+            ("store_health", store.health),
+            # Writes last so reads measure the generated dataset
+            ("store_put_user", put_user),
+            ("store_increment_points", lambda: store.increment_points(random_user(), 1)),
+            ("store_append_action", lambda: store.append_action(random_user(), action, rewards.MAX_ACTION_HISTORY)),
+        ]
+        for name, func in ops:
+            if args.ops and name not in args.ops:
+                continue
+            func()  # warm-up: first load parses the file and builds the rank index
+            latencies, elapsed, errors = _measure(func, args.duration, args.min_iterations, args.max_iterations)
+            results.append(summarize(size_label, f"store-{backend}", name, latencies, elapsed, errors))
+            _progress(results[-1])
+    return results
+
+
+# -------------------------
+# HTTP load generator
+# -------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(port: int, process, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"uvicorn did not become healthy within {timeout}s")
+
+
+def _http_worker(port, make_request, stop_at, latencies, lock, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    local = []
+    local_errors = 0
+    while time.perf_counter() < stop_at:
+        method, path, body = make_request()
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                local_errors += 1
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local.append(time.perf_counter() - t0)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += local_errors
+
+
+def run_http(size_label, users, dataset, workdir, args):
+    shutil.copyfile(dataset, os.path.join(workdir, "rewards_db.json"))
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", BACKEND_DIR, "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--workers", str(args.workers),
+    ]
+    log_path = os.path.join(workdir, "uvicorn.log")
+    log_file = open(log_path, "wb")
+    env = dict(os.environ)
+    if not args.rate_limit:
+        # The load generator is a single client; measure the handlers, not the limiter
+        env["RATE_LIMIT_ENABLED"] = "false"
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    rng_lock = threading.Lock()
+    rng = random.Random(args.seed)
+    try:
+        try:
+            _wait_for_server(port, process, args.startup_timeout)
+        except RuntimeError:
+            log_file.flush()
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                sys.stderr.write(f.read()[-4000:])
+            raise
+        from routers.rewards import ACTION_POINTS
+        action_types = list(ACTION_POINTS)
+
+        def random_user():
+            with rng_lock:
+                return datagen.user_id_for(rng.randrange(users))
+
+        def update_request():
+            with rng_lock:
+                action_type = rng.choice(action_types)
+            body = json.dumps({"user_id": random_user(), "action_type": action_type, "amount": 1.0})
+            return "POST", "/api/rewards/update", body
+
+        scenarios = [
+            ("get_leaderboard", lambda: ("GET", "/api/rewards/leaderboard?limit=100", None)),
+            ("get_user_rewards_data", lambda: ("GET", f"/api/rewards/user/{random_user()}", None)),
+            ("ready", lambda: ("GET", "/ready", None)),
+            ("credits_price", lambda: ("GET", "/api/credits/price", None)),
+            ("credits_trade", lambda: ("POST", "/api/credits/trade", '{"amount": 10, "action": "buy"}')),
+            ("update_rewards", update_request),
+        ]
+        results = []
+        for name, make_request in scenarios:
+            if args.ops and name not in args.ops:
+                continue
+            latencies = []
+            errors = [0]
+            lock = threading.Lock()
+            start = time.perf_counter()
+            stop_at = start + args.duration
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for _ in range(args.concurrency):
+                    pool.submit(_http_worker, port, make_request, stop_at, latencies, lock, errors)
+            elapsed = time.perf_counter() - start
+            results.append(summarize(size_label, "http", name, latencies, elapsed, errors[0], args.concurrency))
+            _progress(results[-1])
+        return results
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log_file.close()
+
+
+# -------------------------
+# Baseline comparison
+# -------------------------
+def _row_key(row):
+    return (row["size"], row["mode"], row["op"], row.get("concurrency", 1))
+
+
+def compare(results, baseline, tolerance: float):
+    """Return rows whose latency or throughput regressed by more than `tolerance`"""
+    previous = {_row_key(row): row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        base = previous.get(_row_key(row))
+        if base is None:
+            continue
+        checks = {
+            "p50_ms": row["p50_ms"] > base["p50_ms"] * (1 + tolerance),
+            "p99_ms": row["p99_ms"] > base["p99_ms"] * (1 + tolerance),
+            "throughput_ops": row["throughput_ops"] < base["throughput_ops"] * (1 - tolerance),
+        }
+        for metric, regressed in checks.items():
+            if regressed:
+                regressions.append({
+                    "size": row["size"], "mode": row["mode"], "op": row["op"], "metric": metric,
+                    "baseline": base[metric], "current": row[metric],
+                })
+    return regressions
+
+
+# -------------------------
+# CLI
+# -------------------------
+def _progress(row):
+    print(
+        f"  {row['size']:>5} {row['mode']:<12} {row['op']:<22} "
+        f"{row['throughput_ops']:>10.1f} ops/s  p50 {row['p50_ms']:>9.3f} ms  p99 {row['p99_ms']:>9.3f} ms"
+        f"  (n={row['iterations']}, errors={row['errors']})",
+        flush=True,
+    )
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CarbonX backend benchmarks")
+    parser.add_argument("--sizes", default="1k", help="Comma-separated dataset sizes: 1k,100k,1m or a number")
+    parser.add_argument("--mode", choices=("inprocess", "http", "storage", "all"), default="inprocess")
+    parser.add_argument("--ops", default="", help="Comma-separated subset of operations to run")
+    parser.add_argument("--backends", default="memory,file", help="Storage mode: comma-separated backends to compare")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per operation")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=16, help="HTTP mode: concurrent connections")
+    parser.add_argument("--workers", type=int, default=1, help="HTTP mode: uvicorn worker processes")
+    parser.add_argument("--rate-limit", action="store_true", help="HTTP mode: keep rate limiting enabled")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=datagen.DEFAULT_SEED)
+    parser.add_argument("--actions-per-user", type=int, default=datagen.DEFAULT_ACTIONS_PER_USER)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where generated datasets are kept")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.ops = {op.strip() for op in args.ops.split(",") if op.strip()}
+    args.backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    modes = ("inprocess", "http", "storage") if args.mode == "all" else (args.mode,)
+    runners = {"inprocess": run_inprocess, "http": run_http, "storage": run_storage}
+
+    results = []
+    for size_label in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+        users = datagen.parse_size(size_label)
+        print(f"Preparing dataset {size_label} ({users} users)...", flush=True)
+        dataset = datagen.ensure_dataset(args.cache_dir, users, args.seed, args.actions_per_user)
+        for mode in modes:
+            workdir = tempfile.mkdtemp(prefix=f"carbonx-bench-{size_label}-{mode}-")
+            try:
+                results.extend(runners[mode](size_label, users, dataset, workdir, args))
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "actions_per_user": args.actions_per_user,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        report["baseline"] = {"file": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+        for r in regressions:
+            print(f"REGRESSION {r['size']} {r['mode']} {r['op']} {r['metric']}: {r['baseline']} -> {r['current']}")
+        if regressions and args.fail_on_regression:
+            exit_code = 1
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Crash-safe snapshots of the rewards DB.
+
+- `serialize_db()` writes compact JSON, the cheapest form to produce.
+- `atomic_write()` writes to a temp file in the same directory, fsyncs and
+  renames over the target, so readers (and a crash) only ever see the old or
+  the new file, never a truncated one.
+- `Checkpointer` keeps a bounded set of point-in-time generations in
+  `<db>.checkpoints/`, copied from the primary file by a background thread
+  once enough bytes have been written or enough time has passed, optionally
+  gzip-compressed. `restore_latest()` recovers the newest readable one when
+  the primary is missing or corrupt.
+"""
+from datetime import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import file_lock
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+FSYNC_ENABLED = os.getenv("REWARDS_DB_FSYNC", "true").lower() == "true"
+CHECKPOINT_INTERVAL_SECONDS = _env_float("REWARDS_CHECKPOINT_INTERVAL_SECONDS", 300.0)
+CHECKPOINT_BYTES = _env_float("REWARDS_CHECKPOINT_BYTES", 64 * 1024 * 1024)
+# Floor between checkpoints: once the DB outgrows CHECKPOINT_BYTES every save
+# would otherwise trigger another full copy
+CHECKPOINT_MIN_INTERVAL_SECONDS = _env_float("REWARDS_CHECKPOINT_MIN_INTERVAL_SECONDS", 60.0)
+CHECKPOINT_RETAIN = int(_env_float("REWARDS_CHECKPOINT_RETAIN", 5))
+CHECKPOINT_COMPRESS = os.getenv("REWARDS_CHECKPOINT_COMPRESS", "true").lower() == "true"
+
+CHECKPOINTS_WRITTEN = metrics.REGISTRY.counter(
+    "carbonx_rewards_checkpoints_total",
+    "Rewards DB checkpoints, by result (written/skipped/failed)",
+    ("result",),
+)
+CHECKPOINT_SECONDS = metrics.REGISTRY.histogram(
+    "carbonx_rewards_checkpoint_seconds",
+    "Time spent writing one rewards DB checkpoint",
+)
+
+
+# -------------------------
+# Serialization and atomic writes
+# -------------------------
+def serialize_db(data: dict) -> bytes:
+    """Compact JSON in a single `json.dumps` call; it runs under the write lock on every save"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fsync_directory(path: str):
+    if not FSYNC_ENABLED or not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, payload: bytes):
+    """Replace `path` with `payload` via temp file + fsync + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp creates 0600 files; keep the permissions of the file being replaced
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            if FSYNC_ENABLED:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+# -------------------------
+# Checkpoint generations
+# -------------------------
+def checkpoint_dir_for(db_path: str) -> str:
+    return f"{db_path}.checkpoints"
+
+
+def list_checkpoints(db_path: str):
+    """Checkpoint files, newest first"""
+    pattern = os.path.join(checkpoint_dir_for(db_path), "rewards_db-*.json*")
+    paths = [p for p in glob.glob(pattern) if not p.endswith(".tmp")]
+    return sorted(paths, reverse=True)
+
+
+def _open_checkpoint(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def write_checkpoint(db_path: str, compress: bool = CHECKPOINT_COMPRESS, retain: int = CHECKPOINT_RETAIN):
+    """Copy the current primary file into a new checkpoint generation and prune old ones.
+
+    Returns the checkpoint path, or None when the primary does not exist or
+    another process is already checkpointing.
+    """
+    if not os.path.exists(db_path):
+        return None
+    directory = checkpoint_dir_for(db_path)
+    os.makedirs(directory, exist_ok=True)
+
+    guard = file_lock.TryLock(os.path.join(directory, ".lock"))
+    if not guard.acquire():
+        CHECKPOINTS_WRITTEN.inc("skipped")
+        return None
+    try:
+        with CHECKPOINT_SECONDS.time():
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+            target = os.path.join(directory, f"rewards_db-{stamp}.json" + (".gz" if compress else ""))
+            fd, tmp_path = tempfile.mkstemp(prefix=".checkpoint.", suffix=".tmp", dir=directory)
+            try:
+                # The primary is only ever replaced by rename, so an open handle is a consistent snapshot
+                with open(db_path, "rb") as src, os.fdopen(fd, "wb") as raw:
+                    if compress:
+                        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                    else:
+                        shutil.copyfileobj(src, raw, 1024 * 1024)
+                    raw.flush()
+                    if FSYNC_ENABLED:
+                        os.fsync(raw.fileno())
+                os.replace(tmp_path, target)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            _fsync_directory(directory)
+
+        for stale in list_checkpoints(db_path)[max(1, retain):]:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+        CHECKPOINTS_WRITTEN.inc("written")
+        return target
+    finally:
+        guard.release()
+
+
+def load_checkpoint(path: str) -> dict:
+    with _open_checkpoint(path) as f:
+        data = json.loads(f.read())
+    if not isinstance(data, dict):
+        raise ValueError("checkpoint does not contain a JSON object")
+    return data
+
+
+def restore_latest(db_path: str):
+    """
+    Rebuild the primary file from the newest readable checkpoint.
+    Returns the restored data, or None when no usable checkpoint exists.
+    """
+    for path in list_checkpoints(db_path):
+        try:
+            data = load_checkpoint(path)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable checkpoint {path}: {e}")
+            continue
+        atomic_write(db_path, serialize_db(data))
+        logger.warning(f"Restored rewards DB from checkpoint {path} ({len(data)} users)")
+        return data
+    return None
+
+
+class Checkpointer:
+    """Background thread taking checkpoints on a bytes-written / elapsed-time policy"""
+
+    def __init__(self, db_path_getter, interval_seconds: float = CHECKPOINT_INTERVAL_SECONDS,
+                 max_bytes: float = CHECKPOINT_BYTES, min_interval_seconds: float = CHECKPOINT_MIN_INTERVAL_SECONDS):
+        self._db_path_getter = db_path_getter
+        self.interval_seconds = interval_seconds
+        self.max_bytes = max_bytes
+        self.min_interval_seconds = min_interval_seconds
+        self._bytes_since = 0
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._has_checkpointed = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def notify_write(self, nbytes: int):
+        """Record a save of the primary; cheap enough to call on every write"""
+        with self._lock:
+            self._bytes_since += nbytes
+            self._dirty = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="carbonx-checkpointer", daemon=True)
+                self._thread.start()
+        if self._due():
+            self._wakeup.set()
+
+    def checkpoint_now(self):
+        with self._lock:
+            self._bytes_since = 0
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+            self._has_checkpointed = True
+        try:
+            return write_checkpoint(self._db_path_getter())
+        except Exception as e:
+            CHECKPOINTS_WRITTEN.inc("failed")
+            logger.error(f"Failed to write rewards DB checkpoint: {e}")
+            return None
+
+    def _due(self) -> bool:
+        if not self._dirty:
+            return False
+        elapsed = time.monotonic() - self._last_checkpoint
+        if self._has_checkpointed and elapsed < self.min_interval_seconds:
+            return False
+        return self._bytes_since >= self.max_bytes or elapsed >= self.interval_seconds
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(max(0.05, min(self.interval_seconds, 5.0)))
+            self._wakeup.clear()
+            if self._due():
+                self.checkpoint_now()
@@ -0,0 +1,185 @@
+"""
+Negotiated response compression.
+
+`CompressionMiddleware` compresses complete text/JSON responses of at least
+`COMPRESSION_MIN_SIZE` bytes (default 1024) with the best coding the client
+accepts: brotli when the optional `brotli` package is installed, otherwise
+gzip. Left alone are:
+
+- responses that already carry a `Content-Encoding` or have a binary type
+  (e.g. `/api/rewards/export?gzip=true`, served as `application/gzip`);
+- streaming responses (more than one body message, e.g. the export stream),
+  which are passed through chunk by chunk rather than buffered;
+- HEAD requests, 204 and 304 responses.
+
+Compressible responses get `Vary: Accept-Encoding`, and a strong ETag is
+rewritten per coding (see `http_cache.with_encoding`).
+"""
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import http_cache
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)
+GZIP_LEVEL = _env_int("COMPRESSION_GZIP_LEVEL", 6)
+BROTLI_QUALITY = _env_int("COMPRESSION_BROTLI_QUALITY", 4)
+
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+})
+
+COMPRESSION_BYTES = metrics.REGISTRY.counter(
+    "carbonx_http_compression_bytes_total",
+    "Response body bytes before (in) and after (out) compression, by coding",
+    ("encoding", "stage"),
+)
+
+
+def supported_encodings() -> tuple:
+    """Codings this process can produce, in server preference order"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str, available=None):
+    """Best coding from `available` allowed by an Accept-Encoding header, or None"""
+    available = supported_encodings() if available is None else available
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:  # ties keep the server's preference order
+            best, best_q = coding, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type.endswith("+json") or media_type in COMPRESSIBLE_TYPES
+
+
+def compress(body: bytes, coding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output deterministic for a given body
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing complete, compressible responses"""
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        coding = negotiate(request_headers.get("accept-encoding", ""))
+        if_none_match = request_headers.get("if-none-match")
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if message["status"] == 304:
+                    # Bodyless, so no Content-Type; echo the coding-specific tag the client revalidated with
+                    _add_vary(headers)
+                    etag = headers.get("etag")
+                    for tag in http_cache.parse_if_none_match(if_none_match):
+                        if etag and any(tag == http_cache.with_encoding(etag, c) for c in supported_encodings()):
+                            headers["ETag"] = tag
+                            break
+                    passthrough = True
+                    await send(message)
+                    return
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type")):
+                    passthrough = True
+                    await send(message)
+                    return
+                _add_vary(headers)
+                if coding is None or message["status"] == 204:
+                    passthrough = True
+                    await send(message)
+                    return
+                # Hold the headers until the body shows whether compression applies
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming (never buffered) or too small to be worth it
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, coding, self.gzip_level, self.brotli_quality)
+            COMPRESSION_BYTES.inc(coding, "in", amount=len(body))
+            COMPRESSION_BYTES.inc(coding, "out", amount=len(compressed))
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = http_cache.with_encoding(etag, coding)
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
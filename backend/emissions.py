@@ -0,0 +1,275 @@
+"""
+Server-side emissions calculator.
+
+Mirrors the industry factor tables and the `calculateEmissionResults` /
+`calculateScaleFactor` logic of `public/calculator-assets/app.js`, so results
+computed here match what the browser calculator shows:
+
+    scale  = clamp(mean(inputs) / 1000, 0.1, 5.0)
+    scopeN = round(typical_emissions.scopeN * scale)
+    excess = max(0, scope1 + scope2 + scope3 - 7500)
+    cost   = round(excess * compliance carbon price)
+
+`calculate_batch()` evaluates many inputs at once with NumPy array math, and
+`ResultCache` keeps recent results keyed on the normalized input so repeated
+queries skip the computation entirely. Keep the tables in sync with app.js.
+
+NumPy is imported on first use (or by `warm_up()` during startup) so it does
+not add to app import time.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+import math
+import os
+import threading
+
+import metrics
+
+INDUSTRY_DATA = {
+    "manufacturing": {
+        "name": "Manufacturing",
+        "emission_factor": 0.52,
+        "parameters": ["production_volume", "energy_consumption", "fuel_usage", "transportation"],
+        "typical_emissions": {"scope1": 2500, "scope2": 1800, "scope3": 4200},
+    },
+    "automotive": {
+        "name": "Automotive",
+        "emission_factor": 8.5,
+        "parameters": ["vehicle_production", "assembly_energy", "paint_shop", "testing"],
+        "typical_emissions": {"scope1": 3200, "scope2": 2400, "scope3": 5800},
+    },
+    "steel": {
+        "name": "Steel Production",
+        "emission_factor": 2.3,
+        "parameters": ["raw_materials", "furnace_operations", "electricity", "transportation"],
+        "typical_emissions": {"scope1": 4500, "scope2": 1200, "scope3": 2800},
+    },
+    "cement": {
+        "name": "Cement",
+        "emission_factor": 0.7,
+        "parameters": ["limestone", "kiln_fuel", "grinding_energy", "transportation"],
+        "typical_emissions": {"scope1": 5200, "scope2": 800, "scope3": 1500},
+    },
+    "chemical": {
+        "name": "Chemical Industry",
+        "emission_factor": 1.5,
+        "parameters": ["process_heat", "reactions", "steam_generation", "cooling"],
+        "typical_emissions": {"scope1": 3800, "scope2": 1600, "scope3": 3200},
+    },
+    "power": {
+        "name": "Power Generation",
+        "emission_factor": 820,
+        "parameters": ["fuel_type", "capacity", "efficiency", "transmission"],
+        "typical_emissions": {"scope1": 8500, "scope2": 200, "scope3": 1200},
+    },
+}
+
+CARBON_PRICES = {
+    "voluntary": 15.50,
+    "compliance": 85.20,
+    "future_predicted": 120.00,
+}
+
+COMPLIANCE_LIMIT = 7500  # tCO2e/month above which credits must be bought
+BASE_SCALE = 1000.0
+MIN_SCALE = 0.1
+MAX_SCALE = 5.0
+
+SCOPES = ("scope1", "scope2", "scope3")
+
+# Industry positions in the vectorized lookup table
+INDUSTRY_INDEX = {key: i for i, key in enumerate(INDUSTRY_DATA)}
+_MAX_PARAMETERS = max(len(industry["parameters"]) for industry in INDUSTRY_DATA.values())
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """(numpy module, per-industry scope table), loaded once on first use"""
+    import numpy as np
+    scope_table = np.array(
+        [[industry["typical_emissions"][scope] for scope in SCOPES] for industry in INDUSTRY_DATA.values()],
+        dtype=np.float64,
+    )
+    return np, scope_table
+
+
+def normalize_inputs(industry: str, inputs: dict) -> tuple:
+    """
+    Input values in the industry's parameter order, as a hashable cache key part.
+    Raises ValueError for an unknown industry, missing/unknown parameters or
+    non-finite values.
+    """
+    spec = INDUSTRY_DATA.get(industry)
+    if spec is None:
+        raise ValueError(f"Unknown industry '{industry}'. Must be one of: {', '.join(INDUSTRY_DATA)}")
+    parameters = spec["parameters"]
+    missing = [p for p in parameters if p not in inputs]
+    unknown = [p for p in inputs if p not in parameters]
+    if missing or unknown:
+        problems = []
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+        if unknown:
+            problems.append(f"unknown {', '.join(unknown)}")
+        raise ValueError(f"Invalid inputs for {industry} ({'; '.join(problems)})")
+    values = tuple(float(inputs[p]) for p in parameters)
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError("Input values must be finite numbers")
+    return values
+
+
+def calculate_scale_factor(values) -> float:
+    """Scalar reference for `calculateScaleFactor` in app.js"""
+    average = sum(values) / len(values)
+    return max(MIN_SCALE, min(MAX_SCALE, average / BASE_SCALE))
+
+
+def calculate_emission_results(industry: str, values) -> dict:
+    """Scalar reference for `calculateEmissionResults` in app.js"""
+    base = INDUSTRY_DATA[industry]["typical_emissions"]
+    scale_factor = calculate_scale_factor(values)
+    scopes = [int(math.floor(base[scope] * scale_factor + 0.5)) for scope in SCOPES]
+    total = sum(scopes)
+    excess = max(0, total - COMPLIANCE_LIMIT)
+    return {
+        "industry": industry,
+        "scope1": scopes[0],
+        "scope2": scopes[1],
+        "scope3": scopes[2],
+        "totalEmissions": total,
+        "excessEmissions": excess,
+        "creditCost": int(math.floor(excess * CARBON_PRICES["compliance"] + 0.5)),
+        "scaleFactor": scale_factor,
+    }
+
+
+def calculate_batch(industries, values) -> list:
+    """
+    Vectorized `calculate_emission_results` for many inputs.
+
+    `industries` is a sequence of industry keys and `values` the matching
+    normalized input tuples. Returns one result dict per input, in order.
+    """
+    count = len(industries)
+    if count == 0:
+        return []
+    np, scope_table = _numpy()
+    industry_idx = np.fromiter((INDUSTRY_INDEX[i] for i in industries), dtype=np.intp, count=count)
+    lengths = np.fromiter((len(v) for v in values), dtype=np.float64, count=count)
+    matrix = np.zeros((count, _MAX_PARAMETERS), dtype=np.float64)
+    for row, row_values in enumerate(values):
+        matrix[row, :len(row_values)] = row_values
+
+    # Sum columns left to right, like reduce() in app.js, so results match bit for bit
+    totals = np.zeros(count, dtype=np.float64)
+    for column in range(_MAX_PARAMETERS):
+        totals += matrix[:, column]
+    scale = np.maximum(MIN_SCALE, np.minimum(MAX_SCALE, totals / lengths / BASE_SCALE))
+
+    # JavaScript's Math.round rounds halves up; np.round would round them to even
+    scopes = np.floor(scope_table[industry_idx] * scale[:, None] + 0.5).astype(np.int64)
+    total = scopes.sum(axis=1)
+    excess = np.maximum(0, total - COMPLIANCE_LIMIT)
+    cost = np.floor(excess * CARBON_PRICES["compliance"] + 0.5).astype(np.int64)
+
+    scopes, total, excess, cost, scale = scopes.tolist(), total.tolist(), excess.tolist(), cost.tolist(), scale.tolist()
+    return [
+        {
+            "industry": industries[i],
+            "scope1": scopes[i][0],
+            "scope2": scopes[i][1],
+            "scope3": scopes[i][2],
+            "totalEmissions": total[i],
+            "excessEmissions": excess[i],
+            "creditCost": cost[i],
+            "scaleFactor": scale[i],
+        }
+        for i in range(count)
+    ]
+
+
+class ResultCache:
+    """Bounded LRU of results keyed on (industry, normalized input values)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_many(self, keys) -> list:
+        """Cached result or None per key; hits are moved to the recent end"""
+        found = []
+        with self._lock:
+            for key in keys:
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                found.append(result)
+        return found
+
+    def put_many(self, items):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, result in items:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+result_cache = ResultCache(_env_int("CALCULATOR_CACHE_SIZE", 50000))
+
+metrics.REGISTRY.gauge(
+    "carbonx_calculator_cache_entries",
+    "Emission results held in the calculator result cache",
+    callback=lambda: {(): len(result_cache)},
+)
+
+
+def compute(items, cache: ResultCache = None) -> tuple:
+    """
+    Results for (industry, values) pairs, serving repeats from the cache and
+    computing only the misses in one vectorized pass. Returns (results, cache_hits).
+    """
+    cache = result_cache if cache is None else cache
+    keys = list(items)
+    results = cache.get_many(keys)
+
+    # Duplicates within one batch are computed once
+    missing = OrderedDict()
+    for key, result in zip(keys, results):
+        if result is None:
+            missing.setdefault(key, None)
+    hits = len(keys) - sum(1 for r in results if r is None)
+
+    if missing:
+        computed = calculate_batch([k[0] for k in missing], [k[1] for k in missing])
+        fresh = dict(zip(missing, computed))
+        cache.put_many(fresh.items())
+        results = [fresh[key] if result is None else result for key, result in zip(keys, results)]
+
+    metrics.CACHE_REQUESTS.inc("calculator", "hit", amount=hits)
+    metrics.CACHE_REQUESTS.inc("calculator", "miss", amount=len(keys) - hits)
+    return results, hits
+
+
+def warm_up() -> dict:
+    """Load NumPy and run one calculation so the first batch request is not the slow one"""
+    industry = next(iter(INDUSTRY_DATA))
+    calculate_batch([industry], [(BASE_SCALE,) * len(INDUSTRY_DATA[industry]["parameters"])])
+    return {"industries": len(INDUSTRY_DATA)}
@@ -0,0 +1,108 @@
+"""
+Streaming encoders for bulk rewards exports.
+
+Encoders walk a DB snapshot user by user and yield ~64 KiB byte chunks, so
+memory stays constant regardless of DB size. The snapshot is the dict
+returned by `load_rewards_db()`: writers replace it copy-on-write and never
+mutate it, so iterating it is consistent even while updates land.
+"""
+import csv
+import io
+import json
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+CSV_COLUMNS = [
+    "user_id", "ecoPoints", "rank", "badges", "created_at", "updated_at",
+    "action_type", "action_amount", "action_points_earned", "action_timestamp", "action_metadata",
+]
+
+# Internal bookkeeping that is not user data
+_EXCLUDED_FIELDS = {"idempotency_keys"}
+
+
+def iter_users(snapshot: dict, updated_since: str = None):
+    """Yield (user_id, user) pairs, optionally only users updated after `updated_since`"""
+    for user_id, user in snapshot.items():
+        if not isinstance(user, dict):
+            continue
+        if updated_since is not None and str(user.get("updated_at", "")) <= updated_since:
+            continue
+        yield user_id, user
+
+
+def _export_record(user_id, user) -> dict:
+    record = {"user_id": user_id}
+    record.update((key, value) for key, value in user.items() if key not in _EXCLUDED_FIELDS)
+    return record
+
+
+def _chunked(pieces):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def ndjson_lines(users):
+    for user_id, user in users:
+        yield (json.dumps(_export_record(user_id, user), ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def csv_lines(users):
+    """One row per action; users without actions get a single row with empty action columns"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value.encode("utf-8")
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for user_id, user in users:
+        badges = user.get("badges") if isinstance(user.get("badges"), list) else []
+        prefix = [
+            user_id, user.get("ecoPoints", 0), user.get("rank", 0), "|".join(map(str, badges)),
+            user.get("created_at", ""), user.get("updated_at", ""),
+        ]
+        actions = [a for a in user.get("actions", []) if isinstance(a, dict)] if isinstance(user.get("actions"), list) else []
+        if not actions:
+            writer.writerow(prefix + [""] * 5)
+        for action in actions:
+            writer.writerow(prefix + [
+                action.get("type", ""), action.get("amount", ""), action.get("points_earned", ""),
+                action.get("timestamp", ""), json.dumps(action.get("metadata") or {}, ensure_ascii=False),
+            ])
+        yield flush()
+
+
+def gzip_stream(chunks, level: int = 6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(snapshot: dict, fmt: str, updated_since: str = None, compress: bool = False):
+    users = iter_users(snapshot, updated_since)
+    lines = ndjson_lines(users) if fmt == "ndjson" else csv_lines(users)
+    chunks = _chunked(lines)
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,160 @@
+"""
+Cross-process coordination for the rewards DB file.
+
+`uvicorn main:app --workers N` runs N independent processes over the same
+`rewards_db.json`. Each process keeps its own parsed copy of the file, so
+they need two things from each other:
+
+- mutual exclusion for read-modify-write cycles (an exclusive `flock` on a
+  sidecar `<db>.lock` file) and for readers against in-progress writes
+  (a shared `flock`);
+- a cheap way to notice that another process changed the file. Writers bump
+  an 8-byte generation counter stored in the lock file after every write;
+  readers fold it into their cache signature, which is more reliable than
+  file timestamps whose resolution is only a few milliseconds.
+
+`fcntl` is POSIX-only. Without it (Windows) locking degrades to in-process
+only, which is correct for the single-worker setup used there.
+"""
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_GENERATION = struct.Struct("<Q")
+
+# Generation tracking needs positional I/O, which is also POSIX-only
+SUPPORTED = fcntl is not None and hasattr(os, "pread")
+
+# One open fd per lock file for generation reads, reopened when the path
+# stops naming the inode it was opened on (lock file deleted or replaced).
+# pread/pwrite run under _fd_lock so an fd is never closed while in use.
+_fd_lock = threading.Lock()
+_generation_fds = {}
+
+
+def lock_path_for(db_path: str) -> str:
+    return f"{db_path}.lock"
+
+
+def _generation_fd(lock_path: str):
+    """Open fd on the current `lock_path`; call with `_fd_lock` held"""
+    fd = _generation_fds.get(lock_path)
+    if fd is not None:
+        try:
+            st = os.stat(lock_path)
+            opened = os.fstat(fd)
+            if (st.st_dev, st.st_ino) == (opened.st_dev, opened.st_ino):
+                return fd
+        except OSError:
+            pass
+        del _generation_fds[lock_path]
+        os.close(fd)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    _generation_fds[lock_path] = fd
+    return fd
+
+
+def release_generation_fds():
+    """Close the cached generation fds; they are reopened on next use"""
+    with _fd_lock:
+        while _generation_fds:
+            os.close(_generation_fds.popitem()[1])
+
+
+def _read_generation(lock_path: str) -> int:
+    data = os.pread(_generation_fd(lock_path), _GENERATION.size, 0)
+    return _GENERATION.unpack(data)[0] if len(data) == _GENERATION.size else 0
+
+
+def read_generation(lock_path: str) -> int:
+    """Current write generation; 0 when nothing has been written yet"""
+    if not SUPPORTED:
+        return 0
+    try:
+        with _fd_lock:
+            return _read_generation(lock_path)
+    except OSError:
+        return 0
+
+
+def bump_generation(lock_path: str) -> int:
+    """Increment the generation; call while holding the exclusive lock"""
+    if not SUPPORTED:
+        return 0
+    with _fd_lock:
+        try:
+            generation = _read_generation(lock_path) + 1
+        except OSError:
+            generation = 1
+        os.pwrite(_generation_fd(lock_path), _GENERATION.pack(generation), 0)
+    return generation
+
+
+class FileLock:
+    """
+    One acquisition of the sidecar lock. Each acquisition opens its own file
+    description, so threads of the same process also exclude each other.
+    """
+
+    __slots__ = ("path", "shared", "_fd")
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._fd = None
+
+    def __enter__(self):
+        if not SUPPORTED:
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        except BaseException:
+            os.close(self._fd)
+            self._fd = None
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        return False
+
+
+class TryLock:
+    """Non-blocking exclusive lock, for work only one process needs to do"""
+
+    __slots__ = ("path", "_fd")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self) -> bool:
+        if not SUPPORTED:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
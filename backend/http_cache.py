@@ -0,0 +1,58 @@
+"""
+Conditional GET support: strong ETags and `If-None-Match` checks.
+
+Endpoints derive an ETag from the version counters of the data they render
+(see `make_etag`) and answer a matching `If-None-Match` with a bodyless 304
+before building the response. `CompressionMiddleware` gives each content
+coding its own strong tag by appending `-gzip` / `-br` inside the quotes;
+matching ignores that suffix, so a cached variant of either encoding
+revalidates against the same resource version.
+"""
+import hashlib
+
+from fastapi.responses import Response
+
+ENCODING_SUFFIXES = {"gzip": "-gzip", "br": "-br"}
+
+
+def make_etag(kind: str, *parts) -> str:
+    """Strong ETag for `kind` at the version identified by `parts`"""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=10).hexdigest()
+    return f'"{kind}-{digest}"'
+
+
+def with_encoding(etag: str, coding: str) -> str:
+    """The ETag of the `coding`-encoded representation"""
+    suffix = ENCODING_SUFFIXES.get(coding)
+    if not suffix or not etag.endswith('"'):
+        return etag
+    return etag[:-1] + suffix + '"'
+
+
+def _base_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]  # If-None-Match uses weak comparison
+    for suffix in ENCODING_SUFFIXES.values():
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def parse_if_none_match(header: str) -> list:
+    """Entity tags listed in an `If-None-Match` header (`*` kept as is)"""
+    return [tag.strip() for tag in (header or "").split(",") if tag.strip()]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether `If-None-Match` lists `etag` (in any content coding) or `*`"""
+    if not if_none_match or not etag:
+        return False
+    for tag in parse_if_none_match(if_none_match):
+        if tag == "*" or _base_tag(tag) == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
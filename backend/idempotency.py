@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for retried writes.
+
+Completed responses are kept in two places:
+
+- a bounded, TTL-evicting in-memory cache that answers repeats without
+  touching storage;
+- the user's own rewards record (`idempotency_keys`), written in the same
+  save as the points update, so a replay after a restart (or on another
+  worker) still finds the original response and the key can never be
+  recorded without its points or vice versa.
+
+Keys are scoped per user, so two users can reuse the same key value.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+import time
+
+import metrics
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# Field on the user record holding persisted keys
+USER_FIELD = "idempotency_keys"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+IDEMPOTENCY_TTL_SECONDS = _env_int("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+IDEMPOTENCY_MAX_ENTRIES = _env_int("IDEMPOTENCY_MAX_ENTRIES", 10000)
+IDEMPOTENCY_MAX_KEYS_PER_USER = _env_int("IDEMPOTENCY_MAX_KEYS_PER_USER", 20)
+
+IDEMPOTENCY_REQUESTS = metrics.REGISTRY.counter(
+    "carbonx_idempotency_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome (new/replayed/conflict/in_progress)",
+    ("outcome",),
+)
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request payload"""
+
+
+class IdempotencyInProgress(Exception):
+    """A request with the same key is still being processed"""
+
+
+def fingerprint(payload: dict) -> str:
+    """Stable hash of a request payload, used to detect key reuse with different bodies"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def prune_persisted(entries, now: datetime = None, max_keys: int = None) -> dict:
+    """Drop expired keys from a user's persisted map and keep only the newest `max_keys`"""
+    if not isinstance(entries, dict):
+        return {}
+    now = now or datetime.now()
+    max_keys = IDEMPOTENCY_MAX_KEYS_PER_USER if max_keys is None else max_keys
+    cutoff = (now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)).isoformat()
+    live = [
+        (key, entry) for key, entry in entries.items()
+        if isinstance(entry, dict) and entry.get("created_at", "") >= cutoff
+    ]
+    live.sort(key=lambda item: item[1].get("created_at", ""))
+    return dict(live[-max_keys:]) if max_keys > 0 else {}
+
+
+class IdempotencyStore:
+    """Bounded TTL cache of completed responses plus the set of in-flight keys"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (user_id, key) -> (expires_at, fingerprint, response)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def _lookup(self, scoped_key, request_fingerprint):
+        entry = self._entries.get(scoped_key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[scoped_key]
+            return None
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyConflict()
+        return response
+
+    def begin(self, user_id: str, key: str, request_fingerprint: str):
+        """
+        Claim a key for processing or return the stored response for a repeat.
+
+        Returns the original response for a repeat, or None when the caller now
+        owns the key and must call `complete()` or `abort()`.
+        """
+        scoped_key = (user_id, key)
+        try:
+            with self._lock:
+                response = self._lookup(scoped_key, request_fingerprint)
+                if response is not None:
+                    IDEMPOTENCY_REQUESTS.inc("replayed")
+                    return response
+                if scoped_key in self._pending:
+                    raise IdempotencyInProgress()
+                self._pending.add(scoped_key)
+        except IdempotencyConflict:
+            IDEMPOTENCY_REQUESTS.inc("conflict")
+            raise
+        except IdempotencyInProgress:
+            IDEMPOTENCY_REQUESTS.inc("in_progress")
+            raise
+        return None
+
+    def replay_persisted(self, user_id: str, key: str, request_fingerprint: str, persisted):
+        """
+        Check a claimed key against the user's persisted `idempotency_keys` map,
+        which covers keys completed before a restart or by another worker.
+        Returns the stored response (releasing the claim) or None.
+        """
+        scoped_key = (user_id, key)
+        entry = prune_persisted(persisted).get(key)
+        if entry is None:
+            IDEMPOTENCY_REQUESTS.inc("new")
+            return None
+        with self._lock:
+            self._pending.discard(scoped_key)
+            if entry.get("fingerprint") != request_fingerprint:
+                IDEMPOTENCY_REQUESTS.inc("conflict")
+                raise IdempotencyConflict()
+            response = entry.get("response")
+            self._remember(scoped_key, request_fingerprint, response)
+        IDEMPOTENCY_REQUESTS.inc("replayed")
+        return response
+
+    def complete(self, user_id: str, key: str, request_fingerprint: str, response: dict):
+        scoped_key = (user_id, key)
+        with self._lock:
+            self._pending.discard(scoped_key)
+            self._remember(scoped_key, request_fingerprint, response)
+
+    def abort(self, user_id: str, key: str):
+        """Release a claimed key after a failure so the client can retry"""
+        with self._lock:
+            self._pending.discard((user_id, key))
+
+    def _remember(self, scoped_key, request_fingerprint, response):
+        # Entries stay in insertion order, which is also expiry order, so
+        # expired ones are swept from the front in amortized O(1)
+        now = time.monotonic()
+        self._entries.pop(scoped_key, None)
+        self._entries[scoped_key] = (now + self.ttl_seconds, request_fingerprint, response)
+        while self._entries:
+            oldest_key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_key]
+
+    @staticmethod
+    def persisted_entry(request_fingerprint: str, response: dict) -> dict:
+        return {
+            "fingerprint": request_fingerprint,
+            "response": response,
+            "created_at": datetime.now().isoformat()
+        }
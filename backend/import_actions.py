@@ -0,0 +1,305 @@
+"""
+Offline bulk import / backfill of historical eco-actions.
+
+Usage (from the backend directory):
+
+    python import_actions.py partner-actions.ndjson
+    python import_actions.py partner-actions.csv.gz --db /data/rewards_db.json
+    cat actions.ndjson | python import_actions.py - --format ndjson --dry-run
+
+Each input record has `user_id`, `action_type` and optionally `amount` (default 1),
+`timestamp` (ISO 8601, default now) and `metadata` (an object; a JSON string in CSV).
+Records are applied per user in file order, using the same point values
+(`ACTION_POINTS`) and badge rules as `POST /api/rewards/update`, including the
+last-100-actions window the badge counts are taken over.
+
+The input is streamed and aggregated per user in memory, merged onto the
+existing store, and the store is written once. The DB write lock is held for
+the whole run so server writes wait instead of being overwritten: run it
+during a maintenance window.
+"""
+from collections import Counter, deque
+from datetime import datetime
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+from routers import rewards
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.applied = 0
+        self.skipped = 0
+        self.new_users = 0
+        self.replaced = 0
+        self.points = 0
+        self.badges = 0
+        self.started = time.perf_counter()
+        self.errors = Counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def rate(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "new_users": self.new_users,
+            "replaced_records": self.replaced,
+            "points_awarded": self.points,
+            "badges_awarded": self.badges,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_minute": round(self.rate() * 60),
+            "skip_reasons": dict(self.errors),
+        }
+
+
+class UserState:
+    """Running totals for one user while replaying actions"""
+
+    __slots__ = ("eco_points", "badges", "actions", "type_counts", "stats", "created_at", "base")
+
+    def __init__(self, existing, now_iso: str):
+        if isinstance(existing, dict):
+            points = existing.get("ecoPoints", 0)
+            self.eco_points = int(points) if isinstance(points, (int, float)) else 0
+            self.badges = list(existing.get("badges", [])) if isinstance(existing.get("badges"), list) else []
+            actions = existing.get("actions", [])
+            actions = [a for a in actions if isinstance(a, dict)] if isinstance(actions, list) else []
+            self.stats = rewards.copy_stats(rewards.user_stats(existing))
+            self.created_at = existing.get("created_at", now_iso)
+            self.base = existing
+        else:
+            self.eco_points = 0
+            self.badges = []
+            actions = []
+            self.stats = rewards.empty_stats()
+            self.created_at = None
+            self.base = None
+        self.actions = deque(actions[-rewards.MAX_ACTION_HISTORY:], maxlen=rewards.MAX_ACTION_HISTORY)
+        self.type_counts = rewards.count_action_types(list(self.actions))
+
+    def apply(self, action_type: str, amount, timestamp: str, metadata: dict) -> tuple:
+        points_earned, amount = rewards.calculate_points(action_type, amount)
+        self.eco_points += points_earned
+        rewards.add_action_to_stats(self.stats, action_type, amount, points_earned)
+
+        # Keep per-type counts in step with the bounded history window
+        if len(self.actions) == self.actions.maxlen:
+            self.type_counts[self.actions[0].get("type", "")] -= 1
+        self.actions.append({
+            "type": action_type,
+            "amount": amount,
+            "points_earned": points_earned,
+            "timestamp": timestamp,
+            "metadata": metadata
+        })
+        self.type_counts[action_type] += 1
+
+        new_badges = rewards.badges_earned(self.badges, self.eco_points, action_type, self.type_counts)
+        self.badges.extend(new_badges)
+        if self.created_at is None:
+            self.created_at = timestamp
+        return points_earned, len(new_badges)
+
+    def to_record(self, updated_at: str) -> dict:
+        """Stored record; `updated_at` is when the import writes it, not when the actions happened,
+        so incremental exports pick imported users up"""
+        record = dict(self.base) if self.base is not None else {}
+        record.update({
+            "ecoPoints": self.eco_points,
+            "badges": self.badges,
+            "rank": rewards.calculate_rank(self.eco_points),
+            "actions": list(self.actions),
+            rewards.STATS_FIELD: self.stats,
+            rewards.VERSION_FIELD: rewards.record_version(self.base) + 1,
+            "created_at": self.created_at,
+            "updated_at": updated_at,
+        })
+        return record
+
+
+# -------------------------
+# Input readers
+# -------------------------
+def _open_text(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def read_ndjson(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def read_csv(f):
+    for row in csv.DictReader(f):
+        metadata = row.get("metadata")
+        if metadata:
+            try:
+                row["metadata"] = json.loads(metadata)
+            except json.JSONDecodeError:
+                row["metadata"] = None
+        yield row
+
+
+def normalize(record, now_iso: str):
+    """Validate one input record; returns (user_id, action_type, amount, timestamp, metadata) or a skip reason"""
+    if not isinstance(record, dict):
+        return "malformed_record"
+    user_id = str(record.get("user_id") or "").strip()
+    if not user_id:
+        return "missing_user_id"
+    action_type = record.get("action_type") or record.get("type")
+    if action_type not in rewards.ACTION_POINTS:
+        return "invalid_action_type"
+    amount = record.get("amount")
+    if amount in (None, ""):
+        amount = 1.0
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return "invalid_amount"
+    if amount < 0:
+        return "invalid_amount"
+    timestamp = record.get("timestamp") or now_iso
+    try:
+        timestamp = datetime.fromisoformat(str(timestamp)).isoformat()
+    except ValueError:
+        return "invalid_timestamp"
+    metadata = record.get("metadata")
+    if metadata in (None, ""):
+        metadata = {}
+    if not isinstance(metadata, dict):
+        return "invalid_metadata"
+    return user_id, action_type, amount, timestamp, metadata
+
+
+# -------------------------
+# Import
+# -------------------------
+def aggregate(records, existing_db: dict, stats: ImportStats, states: dict = None, progress=None,
+              progress_every: float = 2.0):
+    """Replay records onto per-user state; returns {user_id: UserState} for touched users"""
+    now_iso = datetime.now().isoformat()
+    states = {} if states is None else states
+    next_report = time.perf_counter() + progress_every
+    for record in records:
+        stats.rows += 1
+        parsed = normalize(record, now_iso)
+        if isinstance(parsed, str):
+            stats.skipped += 1
+            stats.errors[parsed] += 1
+            continue
+        user_id, action_type, amount, timestamp, metadata = parsed
+        state = states.get(user_id)
+        if state is None:
+            state = states[user_id] = UserState(existing_db.get(user_id), now_iso)
+            if user_id not in existing_db:
+                stats.new_users += 1
+            elif state.base is None:
+                # A stored value that is not a user record is replaced, not added
+                stats.replaced += 1
+        points, badge_count = state.apply(action_type, amount, timestamp, metadata)
+        stats.applied += 1
+        stats.points += points
+        stats.badges += badge_count
+        if progress is not None and stats.rows % 4096 == 0 and time.perf_counter() >= next_report:
+            progress(stats)
+            next_report = time.perf_counter() + progress_every
+    return states
+
+
+def run_import(paths, fmt: str = None, dry_run: bool = False, progress=None, checkpoint_after: bool = True) -> dict:
+    stats = ImportStats()
+    with rewards._db_write_lock():
+        db = rewards.load_rewards_db()
+        states = {}
+        for path in paths:
+            with _open_text(path) as f:
+                reader = read_csv if (fmt or detect_format(path)) == "csv" else read_ndjson
+                # Later files continue from the state built by earlier ones
+                aggregate(reader(f), db, stats, states, progress)
+
+        summary = stats.to_dict()
+        summary["users_touched"] = len(states)
+        summary["total_users"] = len(db) + stats.new_users
+        if dry_run or not states:
+            summary["written"] = False
+            return summary
+
+        # Single write of the whole store
+        write_start = time.perf_counter()
+        updated = dict(db)
+        imported_at = datetime.now().isoformat()
+        for user_id, state in states.items():
+            updated[user_id] = state.to_record(imported_at)
+        rewards.save_rewards_db(updated)
+        summary["written"] = True
+        summary["write_seconds"] = round(time.perf_counter() - write_start, 3)
+
+    # A backfill is a large change; keep a restorable generation of it right away
+    if checkpoint_after:
+        summary["checkpoint"] = rewards.checkpointer.checkpoint_now()
+    return summary
+
+
+def _print_progress(stats: ImportStats):
+    print(
+        f"  {stats.rows:>12,} rows  {stats.applied:>12,} applied  {stats.skipped:>8,} skipped  "
+        f"{stats.rate() * 60:>14,.0f} rows/min",
+        file=sys.stderr, flush=True,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import historical eco-actions into the rewards store")
+    parser.add_argument("inputs", nargs="+", help="NDJSON or CSV files (optionally .gz); '-' reads stdin")
+    parser.add_argument("--format", choices=("ndjson", "csv"), help="Input format (default: from file extension)")
+    parser.add_argument("--db", help="Rewards DB path (default: rewards_db.json in the working directory)")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and aggregate without writing")
+    parser.add_argument("--quiet", action="store_true", help="No progress output")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Skip the checkpoint taken after writing")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        rewards.REWARDS_DB_FILE = args.db
+        rewards.invalidate_rewards_cache()
+    missing = [p for p in args.inputs if p != "-" and not os.path.exists(p)]
+    if missing:
+        parser.error(f"input not found: {', '.join(missing)}")
+
+    summary = run_import(args.inputs, args.format, args.dry_run, None if args.quiet else _print_progress,
+                         checkpoint_after=not args.no_checkpoint)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Points-ordered index of rewards users for leaderboard position queries.
+
+Positions follow the leaderboard's order: points descending, then badge
+count descending, then DB insertion order. The index holds one sorted
+`(-points, -badges, seq)` key per user, so a position is a `bisect` away
+instead of a sort of the whole DB.
+
+The index tracks one DB snapshot (the copy-on-write dict from
+`load_rewards_db()`). Local writes move just the changed users; when the
+snapshot is replaced some other way (another worker's write, a bulk import)
+the index is rebuilt on the next query.
+
+Queries may pass `version_of`, the store's snapshot version lookup. With it,
+a reader holding a snapshot that a write has since superseded is answered
+from the newer index instead of rebuilding it back to the old snapshot, and a
+re-parse of the same file version (an equal version, a different dict) is
+not a rebuild either.
+"""
+from bisect import bisect_left, insort
+import threading
+
+import metrics
+
+
+def _points(user) -> int:
+    points = user.get("ecoPoints", 0)
+    return int(points) if isinstance(points, (int, float)) else 0
+
+
+def _badge_count(user) -> int:
+    badges = user.get("badges")
+    return len(badges) if isinstance(badges, list) else 0
+
+
+def _key(user, seq: int) -> tuple:
+    return (-_points(user), -_badge_count(user), seq)
+
+
+class RankIndex:
+    def __init__(self):
+        # Re-entrant so a store can publish a snapshot and re-index it as one step
+        self.lock = threading.RLock()
+        self._source = None    # snapshot the index reflects
+        self._version = None   # its store version, when known
+        self._keys = []        # sorted (-points, -badges, seq)
+        self._entries = {}     # user_id -> (-points, -badges, seq)
+        self._ids = {}         # seq -> user_id
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self):
+        with self.lock:
+            self._source = None
+            self._version = None
+
+    def _rebuild(self, snapshot: dict, version=None):
+        entries = {}
+        ids = {}
+        for seq, (user_id, user) in enumerate(snapshot.items()):
+            if isinstance(user, dict):
+                entries[str(user_id)] = _key(user, seq)
+                ids[seq] = str(user_id)
+        self._keys = sorted(entries.values())
+        self._entries = entries
+        self._ids = ids
+        self._next_seq = len(snapshot)
+        self._source = snapshot
+        self._version = version
+
+    def prepare(self, snapshot: dict, version_of=None):
+        """Build the index for `snapshot` ahead of the first query"""
+        with self.lock:
+            if self._source is not snapshot:
+                self._rebuild(snapshot, version_of(snapshot) if version_of is not None else None)
+
+    def _ensure(self, snapshot: dict, version_of=None):
+        hit = self._source is snapshot
+        version = None
+        if not hit and version_of is not None:
+            version = version_of(snapshot)
+            if self._source is not None:
+                # None: a write superseded `snapshot` after it was loaded, and the
+                # index already reflects something newer; never rebuild backwards
+                hit = version is None or version == self._version
+        metrics.record_cache("rank_index", hit)
+        if not hit:
+            self._rebuild(snapshot, version)
+
+    def position(self, snapshot: dict, user_id: str, version_of=None):
+        """1-based leaderboard position of `user_id` in `snapshot`, or None"""
+        with self.lock:
+            self._ensure(snapshot, version_of)
+            key = self._entries.get(user_id)
+            return None if key is None else bisect_left(self._keys, key) + 1
+
+    def top(self, snapshot: dict, limit: int, version_of=None) -> list:
+        """`(user_id, record)` pairs holding the first `limit` positions in `snapshot`.
+
+        Records come from the indexed snapshot, which may be newer than `snapshot`.
+        """
+        with self.lock:
+            self._ensure(snapshot, version_of)
+            source = self._source
+            return [(self._ids[key[-1]], source[self._ids[key[-1]]]) for key in self._keys[:max(0, limit)]]
+
+    def apply(self, previous: dict, snapshot: dict, user_ids, version=None, previous_version=None):
+        """
+        Re-index `user_ids` after a write replaced `previous` with `snapshot`.
+        Falls back to a lazy rebuild when the index was not tracking `previous`
+        (by identity, or by an equal `previous_version`).
+        """
+        with self.lock:
+            tracking = self._source is previous or (
+                previous_version is not None and self._source is not None and previous_version == self._version)
+            if previous is None or not tracking:
+                self._source = None
+                self._version = None
+                return
+            for user_id in user_ids:
+                old = self._entries.get(user_id)
+                if old is not None:
+                    del self._keys[bisect_left(self._keys, old)]
+                user = snapshot.get(user_id)
+                if not isinstance(user, dict):
+                    if self._entries.pop(user_id, None) is not None:
+                        del self._ids[old[-1]]
+                    continue
+                if old is None:
+                    seq = self._next_seq
+                    self._next_seq += 1
+                    self._ids[seq] = user_id
+                else:
+                    seq = old[-1]
+                key = _key(user, seq)
+                insort(self._keys, key)
+                self._entries[user_id] = key
+            self._source = snapshot
+            self._version = version
@@ -0,0 +1,244 @@
+"""
+Backend logging pipeline.
+
+- Records are written as one JSON object per line (`LOG_FORMAT=text` keeps the
+  classic format). Fields passed with `extra={...}` become JSON fields.
+- Handlers never block a request thread: records go into a bounded queue and a
+  background `QueueListener` thread formats and writes them. JSON encoding
+  and traceback formatting happen on that thread too; when the queue is full
+  the record is dropped and counted instead of waiting.
+- Per-request success logs go through `log_success(logger, route, message,
+  **fields)`, which samples per route before a record is even built:
+  `LOG_SUCCESS_SAMPLE_RATE` (default 0.1) with overrides in
+  `LOG_SUCCESS_SAMPLE_RATES` (`rewards.update=0.01,...`). Kept records carry
+  `route` and `sample_rate` fields.
+- Warnings and errors are deduplicated per call site: the first one in each
+  `LOG_DEDUP_WINDOW_SECONDS` window is written and repeats are counted into
+  the next one written (`repeated`). A token bucket (`LOG_ERROR_RATE` per
+  second, burst `LOG_ERROR_BURST`) caps the total, so a failing storage
+  backend cannot flood the output.
+
+Outcomes are counted in `carbonx_log_records_total{level,outcome}`.
+"""
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import metrics
+
+LOG_RECORDS = metrics.REGISTRY.counter(
+    "carbonx_log_records_total",
+    "Log records by level and outcome (written/sampled_out/suppressed/dropped)",
+    ("level", "outcome"),
+)
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_STANDARD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_rates(spec: str) -> dict:
+    """`route=rate,route=rate` into a dict; malformed entries are ignored"""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        if not sep:
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_type"] = record.exc_info[0].__name__ if record.exc_info[0] else None
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SuccessSampler:
+    """Per-route sampling rates for success logs"""
+
+    def __init__(self, default_rate: float = 1.0, rates: dict = None, rng=random.random):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._rng = rng
+
+    def sample(self, route: str):
+        """The route's rate when this occurrence should be logged, else None"""
+        rate = self.rates.get(route, self.default_rate)
+        if rate >= 1.0 or (rate > 0.0 and self._rng() < rate):
+            return rate
+        return None
+
+
+# Keeps everything until configure() installs the configured rates
+_success_sampler = SuccessSampler()
+
+
+def log_success(logger: logging.Logger, route: str, message: str, **fields):
+    """Log a per-request success line, subject to the route's sample rate"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    rate = _success_sampler.sample(route)
+    if rate is None:
+        LOG_RECORDS.inc("INFO", "sampled_out")
+        return
+    fields["route"] = route
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.info(message, extra=fields)
+
+
+class ErrorLimiter(logging.Filter):
+    """Deduplicate WARNING+ records per call site and cap their overall rate"""
+
+    def __init__(self, window_seconds: float = 60.0, rate: float = 5.0, burst: float = 50.0,
+                 max_sites: int = 10000, clock=time.monotonic):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.rate = rate
+        self.burst = burst
+        self.max_sites = max_sites
+        self._clock = clock
+        self._sites = {}  # key -> [window_start, suppressed]
+        self._tokens = burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.pathname, record.lineno, exc_type)
+        now = self._clock()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is not None and now - site[0] < self.window_seconds:
+                site[1] += 1
+                allowed = False
+            else:
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                allowed = self._tokens >= 1.0
+                if allowed:
+                    self._tokens -= 1.0
+                    if site is not None and site[1]:
+                        record.repeated = site[1]
+                    if site is None and len(self._sites) >= self.max_sites:
+                        self._sites.clear()
+                    self._sites[key] = [now, 0]
+                elif site is not None:
+                    site[1] += 1
+        if not allowed:
+            LOG_RECORDS.inc(record.levelname, "suppressed")
+        return allowed
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them; the listener thread formats.
+    Drops (and counts) records when the queue is full instead of blocking.
+    """
+
+    def prepare(self, record):
+        # Records may be written after the calling frame has moved on, so
+        # freeze the message now (cheap) but leave exc_info for the writer
+        if record.args:
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS.inc(record.levelname, "dropped")
+            return
+        LOG_RECORDS.inc(record.levelname, "written")
+
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure(level: str = None, fmt: str = None, stream=None, force: bool = False):
+    """
+    Install the pipeline on the root logger. Like `logging.basicConfig`, does
+    nothing when the root logger already has handlers unless `force` is set.
+    Returns the queue handler, or None when skipped.
+    """
+    global _listener, _success_sampler
+    with _configure_lock:
+        root = logging.getLogger()
+        if root.handlers and not force:
+            return None
+        shutdown()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        if (fmt or os.getenv("LOG_FORMAT", "json")).lower() == "text":
+            output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        else:
+            output.setFormatter(JsonFormatter())
+
+        _success_sampler = SuccessSampler(
+            _env_float("LOG_SUCCESS_SAMPLE_RATE", 0.1),
+            parse_rates(os.getenv("LOG_SUCCESS_SAMPLE_RATES", "")),
+        )
+        handler = NonBlockingQueueHandler(queue.Queue(int(_env_float("LOG_QUEUE_SIZE", 10000))))
+        handler.addFilter(ErrorLimiter(
+            window_seconds=_env_float("LOG_DEDUP_WINDOW_SECONDS", 60.0),
+            rate=_env_float("LOG_ERROR_RATE", 5.0),
+            burst=_env_float("LOG_ERROR_BURST", 50.0),
+        ))
+        root.addHandler(handler)
+        root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        return handler
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
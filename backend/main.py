@@ -1,16 +1,41 @@
+import time
+
+# Import-time measurement starts before anything heavy is imported
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from routers import auth, credits, rewards
-import os
-import json
+from fastapi.responses import JSONResponse, Response
+from routers import admin, auth, calculator, credits, debug, rewards
+from compression import CompressionMiddleware
+from profiler import ProfilerMiddleware
+from ratelimit import AdmissionControlMiddleware
+from startup import warmup
+import emissions
+import logging_config
+import metrics
 from datetime import datetime
 import logging
 
+# Structured, queue-backed logging; configured here rather than in library modules
+logging_config.configure()
+
 # Basic logger
 logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI(title="CarbonX Backend", version="0.1.0")
+# Warm-up steps run by the lifespan hook, in order
+warmup.add_step("rewards_db", rewards.warm_up)
+warmup.add_step("calculator", emissions.warm_up)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+
+
+app = FastAPI(title="CarbonX Backend", version="0.1.0", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -18,6 +43,8 @@ origins = [
     "https://carbonx-future.vercel.app",  # Production frontend
 ]
 
+# Innermost: shed excess load before routing, but inside CORS so rejections stay readable by browsers
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -25,10 +52,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compresses the final body (CORS headers included); inside profiling and metrics so they time it
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(ProfilerMiddleware)
+# Added last so it wraps every other middleware and sees the final status
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(credits.router, prefix="/api/credits", tags=["credits"])
+app.include_router(calculator.router, prefix="/api/calculator", tags=["calculator"])
 app.include_router(rewards.router, prefix="/api/rewards", tags=["rewards"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(debug.router, prefix="/api", tags=["debug"])
+
+warmup.record_import(time.perf_counter() - _import_started)
 
 
 @app.get("/")
@@ -36,39 +74,10 @@ def root():
     return {"status": "ok", "service": "carbonx-backend"}
 
 
-@app.get("/api/debug/db")
-def debug_database():
-    """Debug endpoint to check rewards database state"""
-    try:
-        db_file = "rewards_db.json"
-
-        # Check if file exists
-        file_exists = os.path.exists(db_file)
-
-        # Try to read the file
-        db_content = None
-        file_size = 0
-        user_count = 0
-
-        if file_exists:
-            file_size = os.path.getsize(db_file)
-            try:
-                with open(db_file, "r", encoding="utf-8") as f:
-                    db_content = json.load(f)
-                    user_count = len(db_content) if isinstance(db_content, dict) else 0
-            except Exception as e:
-                db_content = f"Error reading: {str(e)}"
-
-        return {
-            "file_exists": file_exists,
-            "file_size_bytes": file_size,
-            "user_count": user_count,
-            "working_directory": os.getcwd(),
-            "db_sample": db_content if isinstance(db_content, dict) else str(db_content)[:500],
-        }
-    except Exception as e:
-        logger.exception("Error in debug_database")
-        return {"error": str(e), "working_directory": os.getcwd()}
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # -------------------------
@@ -85,38 +94,26 @@ def health():
 @app.get("/ready", summary="Readiness probe")
 def ready():
     """
-    Readiness probe. Attempts quick checks of critical dependencies.
-    Current implementation checks the presence/readability of `rewards_db.json`.
-    Replace or extend these checks as needed (DB, cache, external services).
+    Readiness probe. Checks the rewards store (for the file backend: the DB
+    file exists and parses, answered from the parse cache while it is
+    unchanged) and, once the lifespan has started it, that the startup
+    warm-up finished. Extend these checks as needed (cache, external services).
     """
-    checks = {"rewards_db": {"ok": False, "reason": None}}
-
-    # Check rewards_db.json
-    db_file = "rewards_db.json"
+    checks = {}
     try:
-        if not os.path.exists(db_file):
-            checks["rewards_db"]["ok"] = False
-            checks["rewards_db"]["reason"] = "file_not_found"
-        else:
-            # try reading and parsing
-            try:
-                with open(db_file, "r", encoding="utf-8") as f:
-                    _ = json.load(f)
-                checks["rewards_db"]["ok"] = True
-                checks["rewards_db"]["reason"] = None
-            except Exception as e:
-                checks["rewards_db"]["ok"] = False
-                checks["rewards_db"]["reason"] = f"read_error: {str(e)[:200]}"
+        checks["rewards_db"] = rewards.store.health()
     except Exception as e:
         # Any unexpected error
         logger.exception("Error while running readiness check")
-        checks["rewards_db"]["ok"] = False
-        checks["rewards_db"]["reason"] = f"unexpected_error: {str(e)[:200]}"
+        checks["rewards_db"] = {"ok": False, "reason": f"unexpected_error: {str(e)[:200]}"}
+    if warmup.state != "not_started":
+        checks["warmup"] = {"ok": warmup.ready, "reason": None if warmup.ready else warmup.state}
 
     # decide overall readiness
     all_ok = all(item["ok"] for item in checks.values())
 
-    body = {"status": "ready" if all_ok else "not_ready", "checks": checks, "timestamp": datetime.utcnow().isoformat() + "Z"}
+    body = {"status": "ready" if all_ok else "not_ready", "checks": checks, "startup": warmup.status(),
+            "timestamp": datetime.utcnow().isoformat() + "Z"}
 
     if all_ok:
         return body
@@ -0,0 +1,372 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in plain dicts keyed by label
+values and guarded by a per-metric lock, so recording a sample costs a
+dict lookup and a few additions. Nothing is formatted until `/metrics`
+is scraped.
+"""
+from bisect import bisect_left
+import threading
+import time
+
+# Latency buckets (seconds) shared by request and storage histograms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Size buckets (bytes) for payloads written to disk
+BYTES_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864, 268435456)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        # Optional callable returning {label_tuple: value}, evaluated at scrape time
+        self._callback = callback
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, *labels, amount=1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount=1.0):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self):
+        if self._callback is not None:
+            try:
+                for key, value in self._callback().items():
+                    self.set(value, *key)
+            except Exception:
+                pass
+        with self._lock:
+            items = list(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def snapshot(self, *labels):
+        """Return (count, sum) for a label set; mainly for tests and debugging"""
+        series = self._values.get(self._key(labels))
+        if series is None:
+            return 0, 0.0
+        return sum(series[:-1]), series[-1]
+
+    def collect(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# -------------------------
+# HTTP request metrics
+# -------------------------
+HTTP_REQUESTS = REGISTRY.counter(
+    "carbonx_http_requests_total",
+    "HTTP requests handled, by method, route template and status code",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "carbonx_http_request_duration_seconds",
+    "HTTP request latency, by method, route template and status code",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "carbonx_http_requests_in_flight",
+    "HTTP requests currently being processed",
+)
+
+# -------------------------
+# Rewards storage metrics
+# -------------------------
+STORAGE_LOAD_SECONDS = REGISTRY.histogram(
+    "carbonx_rewards_db_load_seconds",
+    "Time spent reading the rewards DB file from disk",
+)
+STORAGE_PARSE_SECONDS = REGISTRY.histogram(
+    "carbonx_rewards_db_parse_seconds",
+    "Time spent decoding the rewards DB JSON",
+)
+STORAGE_SAVE_SECONDS = REGISTRY.histogram(
+    "carbonx_rewards_db_save_seconds",
+    "Time spent serializing and writing the rewards DB",
+)
+STORAGE_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "carbonx_rewards_db_lock_wait_seconds",
+    "Time spent waiting for the rewards DB write lock",
+)
+STORAGE_BYTES_READ = REGISTRY.counter(
+    "carbonx_rewards_db_bytes_read_total",
+    "Bytes read from the rewards DB file",
+)
+STORAGE_BYTES_WRITTEN = REGISTRY.counter(
+    "carbonx_rewards_db_bytes_written_total",
+    "Bytes written to the primary rewards DB file (checkpoints are not counted)",
+)
+STORAGE_WRITE_SIZE = REGISTRY.histogram(
+    "carbonx_rewards_db_write_size_bytes",
+    "Size of each rewards DB write",
+    buckets=BYTES_BUCKETS,
+)
+STORAGE_ERRORS = REGISTRY.counter(
+    "carbonx_rewards_db_errors_total",
+    "Rewards DB load/save failures, by operation",
+    ("operation",),
+)
+
+# -------------------------
+# Cache metrics
+# -------------------------
+CACHE_REQUESTS = REGISTRY.counter(
+    "carbonx_cache_requests_total",
+    "Cache lookups, by cache name and result (hit/miss)",
+    ("cache", "result"),
+)
+
+
+def _cache_hit_ratios():
+    ratios = {}
+    with CACHE_REQUESTS._lock:
+        items = list(CACHE_REQUESTS._values.items())
+    totals = {}
+    for (cache, result), value in items:
+        hits, total = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (value if result == "hit" else 0.0), total + value)
+    for cache, (hits, total) in totals.items():
+        ratios[(cache,)] = hits / total if total else 0.0
+    return ratios
+
+
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "carbonx_cache_hit_ratio",
+    "Fraction of cache lookups served from cache, by cache name",
+    ("cache",),
+    callback=_cache_hit_ratios,
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+# -------------------------
+# Threadpool saturation
+# -------------------------
+def _threadpool_usage():
+    # Sync endpoints run on anyio's default thread limiter; read it at scrape time
+    try:
+        from anyio import to_thread
+        limiter = to_thread.current_default_thread_limiter()
+        return {
+            ("in_use",): limiter.borrowed_tokens,
+            ("capacity",): limiter.total_tokens,
+            ("waiting",): limiter.statistics().tasks_waiting,
+        }
+    except Exception:
+        return {}
+
+
+THREADPOOL = REGISTRY.gauge(
+    "carbonx_threadpool_tokens",
+    "Blocking threadpool usage: tokens in use, capacity and waiting tasks",
+    ("state",),
+    callback=_threadpool_usage,
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count and latency per route.
+
+    The route label is the matched path template (e.g. `/api/rewards/user/{user_id}`)
+    so cardinality stays bounded; unmatched paths are grouped under `unmatched`.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            status_code = str(status_holder[0])
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method, route_path, status_code)
+            HTTP_LATENCY.observe(elapsed, method, route_path, status_code)
@@ -0,0 +1,278 @@
+"""
+Opt-in sampling profiler and slow-request capture.
+
+A single daemon thread samples Python stacks with `sys._current_frames()`.
+It runs in one of two modes, both off by default:
+
+- profiling: every thread is sampled and folded into one aggregate, toggled
+  at runtime through the admin routes;
+- slow-request capture: only threads currently bound to a request (inside a
+  `span()` or `traced()` section) are sampled, so requests slower than
+  `PROFILER_SLOW_REQUEST_MS` keep their own stacks and timing breakdown in a
+  bounded ring buffer.
+
+Stacks are exported in the collapsed format (`frame;frame;frame count`)
+understood by flamegraph.pl, speedscope and similar tools.
+"""
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import functools
+import os
+import sys
+import threading
+import time
+
+MAX_STACK_DEPTH = 128
+MAX_DISTINCT_STACKS = 10000
+TRUNCATED_STACK = "[truncated]"
+
+_current_request = ContextVar("profiler_request", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def _add_stack(counter: Counter, stack: str):
+    if stack in counter or len(counter) < MAX_DISTINCT_STACKS:
+        counter[stack] += 1
+    else:
+        counter[TRUNCATED_STACK] += 1
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestRecord:
+    """Timing breakdown (and sampled stacks) for one in-flight request"""
+
+    __slots__ = ("method", "path", "started_at", "start", "spans", "stacks")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow().isoformat() + "Z"
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.stacks = Counter()
+
+    def add_span(self, name: str, seconds: float):
+        count, total = self.spans.get(name, (0, 0.0))
+        self.spans[name] = (count + 1, total + seconds)
+
+    def to_dict(self, status_code: int, duration: float) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "spans": {
+                name: {"count": count, "total_ms": round(total * 1000, 3)}
+                for name, (count, total) in sorted(self.spans.items(), key=lambda item: -item[1][1])
+            },
+            "sample_count": sum(self.stacks.values()),
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stacks = Counter()
+        self._bound = {}  # thread id -> RequestRecord
+        self.profiling = False
+        self.profile_started_at = None
+        self.interval = _env_float("PROFILER_INTERVAL_MS", 10.0) / 1000.0
+        self.slow_interval = _env_float("PROFILER_SLOW_SAMPLE_INTERVAL_MS", 20.0) / 1000.0
+        self.slow_threshold = _env_float("PROFILER_SLOW_REQUEST_MS", 0.0) / 1000.0
+        self.slow_requests = deque(maxlen=max(1, int(_env_float("PROFILER_SLOW_REQUEST_BUFFER", 50))))
+
+    # -------------------------
+    # Control
+    # -------------------------
+    @property
+    def slow_capture(self) -> bool:
+        return self.slow_threshold > 0
+
+    def start(self, interval: float = None):
+        with self._lock:
+            if interval:
+                self.interval = max(0.001, interval)
+            if not self.profiling:
+                self.profiling = True
+                self.profile_started_at = datetime.utcnow().isoformat() + "Z"
+            self._ensure_thread()
+
+    def stop(self):
+        with self._lock:
+            self.profiling = False
+        self._wakeup.set()
+
+    def reset(self):
+        with self._lock:
+            self._stacks = Counter()
+
+    def configure_slow_capture(self, threshold_ms: float = None, buffer_size: int = None):
+        with self._lock:
+            if threshold_ms is not None:
+                self.slow_threshold = max(0.0, threshold_ms) / 1000.0
+            if buffer_size is not None:
+                self.slow_requests = deque(self.slow_requests, maxlen=max(1, buffer_size))
+            if self.slow_capture:
+                self._ensure_thread()
+        self._wakeup.set()
+
+    def status(self) -> dict:
+        return {
+            "profiling": self.profiling,
+            "profile_started_at": self.profile_started_at,
+            "interval_ms": round(self.interval * 1000, 3),
+            "total_samples": sum(self._stacks.values()),
+            "distinct_stacks": len(self._stacks),
+            "slow_request_threshold_ms": round(self.slow_threshold * 1000, 3),
+            "slow_request_buffer_size": self.slow_requests.maxlen,
+            "slow_requests_captured": len(self.slow_requests),
+            "sampler_running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def collapsed(self) -> str:
+        with self._lock:
+            stacks = Counter(self._stacks)
+        return format_collapsed(stacks)
+
+    # -------------------------
+    # Sampler thread
+    # -------------------------
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name="carbonx-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not (self.profiling or self.slow_capture):
+                    self._thread = None
+                    return
+            interval = self.interval if self.profiling else self.slow_interval
+            if self._wakeup.wait(interval):
+                self._wakeup.clear()
+                continue
+            profiling = self.profiling
+            bound = dict(self._bound)
+            if not profiling and not bound:
+                continue
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                record = bound.get(thread_id)
+                if record is None and not profiling:
+                    continue
+                stack = _collapse(frame)
+                with self._lock:
+                    if profiling:
+                        _add_stack(self._stacks, stack)
+                    if record is not None:
+                        _add_stack(record.stacks, stack)
+
+    # -------------------------
+    # Request instrumentation
+    # -------------------------
+    def begin_request(self, method: str, path: str):
+        if self.slow_capture and self._thread is None:
+            with self._lock:
+                self._ensure_thread()
+        return _current_request.set(RequestRecord(method, path))
+
+    def end_request(self, token, status_code: int):
+        record = _current_request.get()
+        _current_request.reset(token)
+        if record is None:
+            return
+        duration = time.perf_counter() - record.start
+        if self.slow_capture and duration >= self.slow_threshold:
+            with self._lock:
+                captured = record.to_dict(status_code, duration)
+            self.slow_requests.append(captured)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a section of the current request and bind its thread for sampling"""
+        record = _current_request.get()
+        if record is None:
+            yield
+            return
+        thread_id = threading.get_ident()
+        outer = self._bound.get(thread_id)
+        self._bound[thread_id] = record
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record.add_span(name, time.perf_counter() - start)
+            if outer is None:
+                self._bound.pop(thread_id, None)
+            else:
+                self._bound[thread_id] = outer
+
+    def traced(self, name: str):
+        """Decorator form of `span()` for sync endpoint functions"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+profiler = SamplingProfiler()
+span = profiler.span
+traced = profiler.traced
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware opening a request record for span timings"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        token = profiler.begin_request(scope.get("method", ""), scope.get("path", ""))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.end_request(token, status_holder[0])
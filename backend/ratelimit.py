@@ -0,0 +1,217 @@
+"""
+In-process rate limiting and admission control.
+
+- `TokenBucketLimiter`: one `[tokens, last_refill]` pair per key (user id or
+  client IP) in an LRU-ordered dict; keys idle longer than `idle_seconds`
+  are swept from the front on each call, so memory is O(active keys).
+- `AdmissionControlMiddleware`: caps concurrent requests process-wide and
+  applies the per-IP bucket to write paths, answering excess load with a
+  fast 503/429 and `Retry-After` before it reaches the threadpool or storage.
+
+Per-user limits need the parsed body, so they are enforced by an async
+route dependency (see `routers/rewards.py`), which also runs on the event
+loop before a sync endpoint takes a worker thread.
+
+Limits are per process; with several workers the effective limit is
+multiplied by the worker count.
+"""
+from collections import OrderedDict
+import json
+import math
+import os
+import threading
+import time
+
+import metrics
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+REQUESTS_SHED = metrics.REGISTRY.counter(
+    "carbonx_requests_shed_total",
+    "Requests rejected before reaching storage, by reason",
+    ("reason",),
+)
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, rate: float, burst: float, idle_seconds: float = 300.0, max_keys: int = 100000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.idle_seconds = idle_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last_refill]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def acquire(self, key: str, cost: float = 1.0, now: float = None):
+        """
+        Take `cost` tokens for `key`. Returns (allowed, retry_after_seconds).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [self.burst, now]
+                self._buckets[key] = bucket
+            else:
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                bucket[0] = tokens if tokens < self.burst else self.burst
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            self._evict(now)
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            retry_after = (cost - bucket[0]) / self.rate if self.rate > 0 else 60.0
+            return False, retry_after
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            oldest_key, oldest = next(iter(buckets.items()))
+            if len(buckets) <= self.max_keys and now - oldest[1] < self.idle_seconds:
+                break
+            del buckets[oldest_key]
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on in-flight requests"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.limit > 0 and self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+user_limiter = TokenBucketLimiter(
+    "user",
+    rate=_env_float("RATE_LIMIT_USER_RATE", 2.0),
+    burst=_env_float("RATE_LIMIT_USER_BURST", 20.0),
+    idle_seconds=_env_float("RATE_LIMIT_IDLE_SECONDS", 300.0),
+    max_keys=int(_env_float("RATE_LIMIT_MAX_KEYS", 100000)),
+)
+ip_limiter = TokenBucketLimiter(
+    "ip",
+    rate=_env_float("RATE_LIMIT_IP_RATE", 20.0),
+    burst=_env_float("RATE_LIMIT_IP_BURST", 100.0),
+    idle_seconds=_env_float("RATE_LIMIT_IDLE_SECONDS", 300.0),
+    max_keys=int(_env_float("RATE_LIMIT_MAX_KEYS", 100000)),
+)
+concurrency_limiter = ConcurrencyLimiter(int(_env_float("MAX_CONCURRENT_REQUESTS", 64)))
+
+metrics.REGISTRY.gauge(
+    "carbonx_rate_limit_tracked_keys",
+    "Active token buckets, by limiter",
+    ("limiter",),
+    callback=lambda: {("user",): len(user_limiter), ("ip",): len(ip_limiter)},
+)
+metrics.REGISTRY.gauge(
+    "carbonx_admission_in_flight",
+    "Requests currently admitted by the global concurrency limit",
+    callback=lambda: {(): concurrency_limiter.in_flight},
+)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def rate_limited_detail(message: str, code: str) -> dict:
+    return {
+        "success": False,
+        "status": "rate_limited",
+        "message": message,
+        "code": code
+    }
+
+
+def client_ip(scope) -> str:
+    if TRUST_FORWARDED_FOR:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionControlMiddleware:
+    """
+    Pure ASGI middleware shedding load before routing.
+
+    `exempt_paths` (probes, metrics) are never shed. `ip_limited_paths` are
+    additionally subject to the per-IP token bucket.
+    """
+
+    def __init__(self, app, exempt_paths=("/health", "/ready", "/metrics"), ip_limited_paths=("/api/rewards/update",)):
+        self.app = app
+        self.exempt_paths = frozenset(exempt_paths)
+        self.ip_limited_paths = frozenset(ip_limited_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope.get("path") in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if scope.get("path") in self.ip_limited_paths:
+            allowed, retry_after = ip_limiter.acquire(client_ip(scope))
+            if not allowed:
+                REQUESTS_SHED.inc("ip_rate")
+                await self._reject(send, 429, retry_after, rate_limited_detail(
+                    "Too many requests from this client. Please slow down.", "RATE_LIMITED"))
+                return
+
+        if not concurrency_limiter.try_acquire():
+            REQUESTS_SHED.inc("overloaded")
+            await self._reject(send, 503, 1.0, {
+                "success": False,
+                "status": "overloaded",
+                "message": "Server is busy. Please retry shortly.",
+                "code": "SERVER_OVERLOADED"
+            })
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            concurrency_limiter.release()
+
+    @staticmethod
+    async def _reject(send, status_code: int, retry_after: float, detail: dict):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", retry_after_header(retry_after).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import Optional
+from collections import Counter
+from datetime import datetime
+import hmac
+import os
+
+from profiler import format_collapsed, profiler
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin routes are disabled unless ADMIN_TOKEN is set and sent as X-Admin-Token"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "success": False,
+                "status": "forbidden",
+                "message": "Admin routes are disabled. Set ADMIN_TOKEN to enable them.",
+                "code": "ADMIN_DISABLED"
+            }
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "success": False,
+                "status": "unauthorized",
+                "message": "Missing or invalid X-Admin-Token header",
+                "code": "INVALID_ADMIN_TOKEN"
+            }
+        )
+
+
+class ProfilerStartRequest(BaseModel):
+    interval_ms: Optional[float] = Field(None, gt=0, le=1000, description="Sampling interval in milliseconds")
+    reset: bool = Field(False, description="Discard previously collected samples")
+
+
+class SlowCaptureRequest(BaseModel):
+    threshold_ms: float = Field(..., ge=0, description="Capture requests slower than this; 0 disables capture")
+    buffer_size: Optional[int] = Field(None, ge=1, le=10000, description="Number of slow requests retained")
+
+
+def _collapsed_download(body: str, name: str):
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.folded"
+    return PlainTextResponse(body, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/profiler", dependencies=[Depends(require_admin)])
+async def profiler_status():
+    return {"success": True, **profiler.status()}
+
+
+@router.post("/profiler/start", dependencies=[Depends(require_admin)])
+async def start_profiler(req: ProfilerStartRequest = ProfilerStartRequest()):
+    if req.reset:
+        profiler.reset()
+    profiler.start(req.interval_ms / 1000.0 if req.interval_ms else None)
+    return {"success": True, **profiler.status()}
+
+
+@router.post("/profiler/stop", dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    profiler.stop()
+    return {"success": True, **profiler.status()}
+
+
+@router.get("/profiler/stacks", dependencies=[Depends(require_admin)])
+async def download_stacks():
+    """Aggregate samples as collapsed stacks (flamegraph.pl / speedscope input)"""
+    return _collapsed_download(profiler.collapsed(), "carbonx-profile")
+
+
+@router.put("/profiler/slow-requests", dependencies=[Depends(require_admin)])
+async def configure_slow_requests(req: SlowCaptureRequest):
+    profiler.configure_slow_capture(req.threshold_ms, req.buffer_size)
+    return {"success": True, **profiler.status()}
+
+
+@router.get("/profiler/slow-requests", dependencies=[Depends(require_admin)])
+async def list_slow_requests():
+    """Captured slow requests, newest first, without their stacks"""
+    records = list(profiler.slow_requests)
+    records.reverse()
+    return {
+        "success": True,
+        "threshold_ms": round(profiler.slow_threshold * 1000, 3),
+        "slow_requests": [
+            {key: value for key, value in record.items() if key != "stacks"}
+            for record in records
+        ]
+    }
+
+
+@router.get("/profiler/slow-requests/{index}/stacks", dependencies=[Depends(require_admin)])
+async def download_slow_request_stacks(index: int):
+    """Collapsed stacks for one captured request; index 0 is the newest"""
+    records = list(profiler.slow_requests)
+    if index < 0 or index >= len(records):
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "success": False,
+                "status": "not_found",
+                "message": f"No captured slow request at index {index}",
+                "code": "SLOW_REQUEST_NOT_FOUND"
+            }
+        )
+    record = records[len(records) - 1 - index]
+    return _collapsed_download(format_collapsed(Counter(record["stacks"])), "carbonx-slow-request")
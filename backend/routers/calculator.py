@@ -0,0 +1,77 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, PrivateAttr, validator
+from typing import Dict, List
+import os
+
+import emissions
+from profiler import span, traced
+
+router = APIRouter()
+
+MAX_BATCH_SIZE = int(os.getenv("CALCULATOR_MAX_BATCH_SIZE", "10000"))
+
+
+class CalculationInput(BaseModel):
+    industry: str = Field(..., description="Industry key, e.g. 'manufacturing'")
+    inputs: Dict[str, float] = Field(..., description="Monthly values for each of the industry's parameters")
+
+    # Input values in the industry's parameter order; also the cache key
+    _values: tuple = PrivateAttr(default=())
+
+    @validator('industry')
+    def validate_industry(cls, v):
+        if v not in emissions.INDUSTRY_DATA:
+            raise ValueError(f"Invalid industry. Must be one of: {', '.join(emissions.INDUSTRY_DATA)}")
+        return v
+
+    @validator('inputs')
+    def validate_inputs(cls, v, values):
+        industry = values.get('industry')
+        if industry is None:
+            return v
+        # Reorder to the industry's parameter order
+        parameters = emissions.INDUSTRY_DATA[industry]["parameters"]
+        return dict(zip(parameters, emissions.normalize_inputs(industry, v)))
+
+    def model_post_init(self, __context):
+        self._values = tuple(self.inputs.values())
+
+
+class BatchCalculationRequest(BaseModel):
+    items: List[CalculationInput] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+@router.get("/industries")
+def get_industries():
+    """Industry factor tables used by the calculator"""
+    return {
+        "success": True,
+        "industries": emissions.INDUSTRY_DATA,
+        "carbon_prices": emissions.CARBON_PRICES,
+        "compliance_limit": emissions.COMPLIANCE_LIMIT,
+    }
+
+
+@router.post("/batch")
+@traced("calculator.batch")
+def calculate_batch(req: BatchCalculationRequest):
+    """Compute footprints for many calculator inputs in one request.
+
+    Results match the browser calculator and are returned in input order.
+    """
+    with span("calculator.compute"):
+        results, cache_hits = emissions.compute((item.industry, item._values) for item in req.items)
+
+    # Results are plain ints/floats/strs; skip jsonable_encoder, which costs more than the math at 10k items
+    return JSONResponse({
+        "success": True,
+        "count": len(results),
+        "cache_hits": cache_hits,
+        "totals": {
+            "totalEmissions": sum(r["totalEmissions"] for r in results),
+            "excessEmissions": sum(r["excessEmissions"] for r in results),
+            "creditCost": sum(r["creditCost"] for r in results),
+        },
+        "results": results,
+    })
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Annotated, List, Optional
+from collections import Counter
 from datetime import datetime
-import json
 import os
 import logging
-import traceback
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import checkpoint
+import export
+import http_cache
+import idempotency
+import metrics
+import ratelimit
+import storage
+from logging_config import log_success
+from profiler import traced
+from routers.admin import require_admin
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -24,7 +30,6 @@ class ErrorResponse(BaseModel):
     code: str
     details: Optional[dict] = None
 
-# In-memory storage (in production, use a database)
 REWARDS_DB_FILE = "rewards_db.json"
 
 # Badge definitions
@@ -79,6 +84,31 @@ BADGE_DEFINITIONS = {
     }
 }
 
+# Badge details as served to clients, built once
+BADGE_DETAILS = {badge_id: {"id": badge_id, **badge_def} for badge_id, badge_def in BADGE_DEFINITIONS.items()}
+
+# Background checkpoints of the primary file
+checkpointer = checkpoint.Checkpointer(lambda: REWARDS_DB_FILE)
+
+# Where users are stored; REWARDS_STORAGE=memory keeps them in process memory (tests, benchmarks)
+store = storage.create_store(os.getenv("REWARDS_STORAGE", "file"), lambda: REWARDS_DB_FILE, checkpointer)
+
+# Leaderboard positions for the current DB snapshot
+rank_index = store.rank_index
+
+# Completed responses for Idempotency-Key replays
+idempotency_store = idempotency.IdempotencyStore()
+
+# Number of recent actions retained per user
+MAX_ACTION_HISTORY = 100
+
+# Field on the user record holding lifetime stats, maintained on every write
+STATS_FIELD = "stats"
+
+# Field on the user record counting its writes (bumped by the store); profile ETags are derived from it
+VERSION_FIELD = storage.VERSION_FIELD
+record_version = storage.record_version
+
 # Action point values
 ACTION_POINTS = {
     "carbon_offset": 50,  # Per ton offset
@@ -90,65 +120,37 @@ ACTION_POINTS = {
     "energy_savings": 25,  # Per MWh saved
 }
 
+def _db_write_lock():
+    """Serialize read-modify-write cycles on the rewards DB across threads and
+    worker processes. Re-entrant within a thread."""
+    return store.write_lock()
+
+def invalidate_rewards_cache():
+    """Drop the parsed DB so the next load re-reads the file"""
+    store.invalidate()
+
 def load_rewards_db():
-    """Load rewards database from file or return empty dict"""
-    try:
-        if os.path.exists(REWARDS_DB_FILE):
-            try:
-                with open(REWARDS_DB_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Validate data structure
-                    if not isinstance(data, dict):
-                        logger.warning("Rewards DB file contains invalid data structure, resetting")
-                        return {}
-                    return data
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse rewards DB JSON: {e}")
-                # Backup corrupted file
-                backup_file = f"{REWARDS_DB_FILE}.backup.{datetime.now().timestamp()}"
-                try:
-                    os.rename(REWARDS_DB_FILE, backup_file)
-                    logger.info(f"Backed up corrupted DB to {backup_file}")
-                except:
-                    pass
-                return {}
-            except Exception as e:
-                logger.error(f"Unexpected error loading rewards DB: {e}")
-                return {}
-        return {}
-    except Exception as e:
-        logger.error(f"Critical error in load_rewards_db: {e}")
-        return {}
+    """Current rewards DB snapshot (empty dict when there is none).
 
-def save_rewards_db(data):
-    """Save rewards database to file"""
-    try:
-        if not isinstance(data, dict):
-            raise ValueError("Data must be a dictionary")
-        
-        # Create backup before saving
-        if os.path.exists(REWARDS_DB_FILE):
-            try:
-                backup_file = f"{REWARDS_DB_FILE}.backup"
-                with open(REWARDS_DB_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            except Exception as backup_error:
-                logger.warning(f"Failed to create backup: {backup_error}")
-        
-        # Write new data
-        with open(REWARDS_DB_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        logger.debug("Successfully saved rewards DB")
-        return True
-    except PermissionError as e:
-        logger.error(f"Permission denied saving rewards DB: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"Error saving rewards DB: {e}")
-        logger.error(traceback.format_exc())
-        raise
+    Callers must treat the returned dict as read-only and copy before mutating.
+    """
+    return store.load()
+
+def rewards_db_version(data):
+    """Version of DB snapshot `data`, or None if it is no longer the current one"""
+    return store.version(data)
+
+def warm_up() -> dict:
+    """Parse the DB into the cache and build the rank index ahead of the first request"""
+    return {"users": store.prepare()}
+
+def save_rewards_db(data, changed_users=None):
+    """Replace the whole rewards DB.
+
+    `changed_users` lists the user ids that differ from the current snapshot,
+    letting the rank index update in place instead of being rebuilt.
+    """
+    return store.save(data, changed_users)
 
 def get_user_rewards(user_id: str):
     """Get or create user rewards entry"""
@@ -156,48 +158,45 @@ def get_user_rewards(user_id: str):
         if not user_id or not isinstance(user_id, str) or len(user_id.strip()) == 0:
             raise ValueError("Invalid user_id provided")
         
-        db = load_rewards_db()
-        
-        # Validate existing user data structure
-        if user_id in db:
-            user_data = db[user_id]
-            # Ensure required fields exist with defaults
-            if not isinstance(user_data, dict):
-                logger.warning(f"Invalid user data structure for {user_id}, resetting")
-                user_data = {}
-            
+        # A record that is not a dict reads as missing and is reset below
+        user_data = store.get_user(user_id)
+        if user_data is not None:
             # Normalize user data
             normalized = {
                 "ecoPoints": int(user_data.get("ecoPoints", 0)) if isinstance(user_data.get("ecoPoints"), (int, float)) else 0,
                 "badges": list(user_data.get("badges", [])) if isinstance(user_data.get("badges"), list) else [],
                 "rank": int(user_data.get("rank", 0)) if isinstance(user_data.get("rank"), (int, float)) else 0,
                 "actions": list(user_data.get("actions", [])) if isinstance(user_data.get("actions"), list) else [],
+                STATS_FIELD: user_stats(user_data),
+                VERSION_FIELD: record_version(user_data),
                 "created_at": user_data.get("created_at", datetime.now().isoformat()),
                 "updated_at": user_data.get("updated_at", datetime.now().isoformat())
             }
-            db[user_id] = normalized
-        else:
+            return normalized
+
+        with _db_write_lock():
+            existing = store.get_user(user_id)
+            if existing is not None:
+                return existing
             # Create new user entry
-            db[user_id] = {
+            return store.put_user(user_id, {
                 "ecoPoints": 0,
                 "badges": [],
                 "rank": 0,
                 "actions": [],
+                STATS_FIELD: empty_stats(),
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
-            }
-            save_rewards_db(db)
-        
-        return db[user_id]
+            })
     except Exception as e:
-        logger.error(f"Error in get_user_rewards for {user_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Error in get_user_rewards for {user_id}: {e}", exc_info=True)
         # Return default structure on error
         return {
             "ecoPoints": 0,
             "badges": [],
             "rank": 0,
             "actions": [],
+            STATS_FIELD: empty_stats(),
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
@@ -211,45 +210,95 @@ def update_user_rewards(user_id: str, updates: dict):
         if not isinstance(updates, dict):
             raise ValueError("Updates must be a dictionary")
         
-        db = load_rewards_db()
-        if user_id not in db:
-            get_user_rewards(user_id)  # Initialize if needed
-            db = load_rewards_db()
-        
-        if user_id not in db:
-            raise ValueError(f"Failed to initialize user {user_id}")
-        
-        # Validate and merge updates safely
-        user_data = db[user_id]
-        if not isinstance(user_data, dict):
-            user_data = {}
-            db[user_id] = user_data
-        
-        # Safely update fields
-        for key, value in updates.items():
-            if key == "ecoPoints":
-                user_data[key] = int(value) if isinstance(value, (int, float)) else 0
-            elif key == "rank":
-                user_data[key] = int(value) if isinstance(value, (int, float)) else 0
-            elif key == "badges":
-                user_data[key] = list(value) if isinstance(value, list) else []
-            elif key == "actions":
-                user_data[key] = list(value) if isinstance(value, list) else []
-            else:
-                user_data[key] = value
-        
-        user_data["updated_at"] = datetime.now().isoformat()
-        save_rewards_db(db)
-        return db[user_id]
+        with _db_write_lock():
+            if store.get_user(user_id) is None:
+                get_user_rewards(user_id)  # Initialize if needed
+
+            stored = store.get_user(user_id)
+            if stored is None:
+                raise ValueError(f"Failed to initialize user {user_id}")
+
+            # Validate and merge updates safely (copy-on-write: the stored record is shared)
+            user_data = dict(stored)
+
+            # Safely update fields
+            for key, value in updates.items():
+                if key == "ecoPoints":
+                    user_data[key] = int(value) if isinstance(value, (int, float)) else 0
+                elif key == "rank":
+                    user_data[key] = int(value) if isinstance(value, (int, float)) else 0
+                elif key == "badges":
+                    user_data[key] = list(value) if isinstance(value, list) else []
+                elif key == "actions":
+                    user_data[key] = list(value) if isinstance(value, list) else []
+                else:
+                    user_data[key] = value
+
+            user_data["updated_at"] = datetime.now().isoformat()
+            return store.put_user(user_id, user_data)
     except Exception as e:
-        logger.error(f"Error in update_user_rewards for {user_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Error in update_user_rewards for {user_id}: {e}", exc_info=True)
         raise
 
 def check_badge_eligibility(user_id: str, eco_points: int, action_type: str):
     """Check if user is eligible for new badges"""
-    user = get_user_rewards(user_id)
-    earned_badges = set(user.get("badges", []))
+    return evaluate_badges(get_user_rewards(user_id), eco_points, action_type)
+
+def count_action_types(actions) -> Counter:
+    """Number of actions per type in a user's retained history"""
+    return Counter(a.get("type", "") for a in actions if isinstance(a, dict)) if isinstance(actions, list) else Counter()
+
+def empty_stats() -> dict:
+    return {"total_actions": 0, "carbon_offset_tons": 0.0, "by_type": {}}
+
+def add_action_to_stats(stats: dict, action_type: str, amount: float, points_earned: int):
+    """Fold one action into lifetime stats in place; callers copy shared stats first"""
+    stats["total_actions"] += 1
+    if action_type == "carbon_offset" and amount > 0:
+        stats["carbon_offset_tons"] += amount
+    totals = stats["by_type"].get(action_type)
+    if totals is None:
+        totals = stats["by_type"][action_type] = {"count": 0, "amount": 0.0, "points": 0}
+    totals["count"] += 1
+    totals["amount"] += amount
+    totals["points"] += points_earned
+
+def stats_from_actions(actions) -> dict:
+    """Stats rebuilt from the retained history, for records written before stats were stored"""
+    stats = empty_stats()
+    for action in actions if isinstance(actions, list) else []:
+        if not isinstance(action, dict):
+            continue
+        try:
+            amount = float(action.get("amount", 0))
+            points = int(action.get("points_earned", 0))
+        except (ValueError, TypeError):
+            amount, points = 0.0, 0
+        add_action_to_stats(stats, action.get("type", ""), amount, points)
+    return stats
+
+def user_stats(user: dict) -> dict:
+    """A user's lifetime stats (read-only: shared with the cached DB)"""
+    stats = user.get(STATS_FIELD)
+    if isinstance(stats, dict) and isinstance(stats.get("by_type"), dict):
+        return stats
+    return stats_from_actions(user.get("actions", []))
+
+def copy_stats(stats: dict) -> dict:
+    return {
+        "total_actions": int(stats.get("total_actions", 0)),
+        "carbon_offset_tons": float(stats.get("carbon_offset_tons", 0.0)),
+        "by_type": {action_type: dict(totals) for action_type, totals in stats.get("by_type", {}).items()},
+    }
+
+@traced("rewards.badge_scan")
+def evaluate_badges(user: dict, eco_points: int, action_type: str):
+    """Return badges newly earned by `user` (including its latest actions) at `eco_points`"""
+    return badges_earned(user.get("badges", []), eco_points, action_type, count_action_types(user.get("actions", [])))
+
+def badges_earned(badges, eco_points: int, action_type: str, type_counts) -> list:
+    """Badge rules over per-type action counts; shared by live updates and bulk imports"""
+    earned_badges = set(badges)
     new_badges = []
     
     # Check each badge definition
@@ -266,11 +315,11 @@ def check_badge_eligibility(user_id: str, eco_points: int, action_type: str):
             eligible = True
         elif badge_id == "eco_investor":
             # Count investments from actions
-            investments = sum(1 for a in user.get("actions", []) if a.get("type") == "investment")
+            investments = type_counts.get("investment", 0)
             if investments >= 5:
                 eligible = True
         elif badge_id == "calculator_master":
-            calc_uses = sum(1 for a in user.get("actions", []) if "calculator" in a.get("type", ""))
+            calc_uses = sum(count for t, count in type_counts.items() if "calculator" in t)
             if calc_uses >= 10:
                 eligible = True
         elif badge_id == "water_warrior" and action_type == "water_calculation":
@@ -278,7 +327,7 @@ def check_badge_eligibility(user_id: str, eco_points: int, action_type: str):
         elif badge_id == "plastic_fighter" and action_type == "plastic_calculation":
             eligible = True
         elif badge_id == "ai_explorer":
-            ai_uses = sum(1 for a in user.get("actions", []) if "ai" in a.get("type", "").lower())
+            ai_uses = sum(count for t, count in type_counts.items() if "ai" in t.lower())
             if ai_uses >= 20:
                 eligible = True
         elif badge_id == "sustainability_hero" and eco_points >= badge_def["points_required"]:
@@ -290,6 +339,23 @@ def check_badge_eligibility(user_id: str, eco_points: int, action_type: str):
     
     return new_badges
 
+def calculate_points(action_type: str, amount) -> tuple:
+    """Points earned for an action; returns (points_earned, normalized_amount)"""
+    base_points = ACTION_POINTS.get(action_type, 10)
+    if not isinstance(base_points, (int, float)):
+        base_points = 10
+    
+    try:
+        amount = float(amount) if amount is not None else 1.0
+        if amount < 0:
+            amount = 0
+        points_earned = int(base_points * amount)
+    except (ValueError, TypeError) as calc_error:
+        logger.warning(f"Invalid amount calculation: {calc_error}, using default")
+        amount = 1.0
+        points_earned = int(base_points * amount)
+    return points_earned, amount
+
 def calculate_rank(eco_points: int) -> int:
     """Calculate user rank based on points"""
     # Simple ranking: every 100 points = 1 rank level
@@ -324,9 +390,125 @@ class LeaderboardQuery(BaseModel):
     limit: Optional[int] = 100
     region: Optional[str] = None  # For future regional leaderboards
 
-@router.post("/update", response_model_exclude_none=True)
-def update_rewards(req: UpdateRewardsRequest):
-    """Update user rewards when they perform an eco-action"""
+async def enforce_user_rate_limit(
+    req: UpdateRewardsRequest,
+    idempotency_key: Annotated[Optional[str], Header(alias=idempotency.HEADER)] = None,
+):
+    """Per-user token bucket; async so it runs before the endpoint takes a worker thread.
+
+    Requests with an Idempotency-Key are charged by the endpoint instead, after
+    the replay check, so retrying a completed request never gets a 429.
+    """
+    if idempotency_key is None:
+        charge_user_rate_limit(req.user_id)
+
+def charge_user_rate_limit(user_id: str):
+    """Take one token from the user's bucket, or raise 429"""
+    if not ratelimit.RATE_LIMIT_ENABLED:
+        return
+    allowed, retry_after = ratelimit.user_limiter.acquire(user_id)
+    if not allowed:
+        ratelimit.REQUESTS_SHED.inc("user_rate")
+        raise HTTPException(
+            status_code=429,
+            detail=ratelimit.rate_limited_detail(
+                "Too many reward updates for this user. Please slow down.", "USER_RATE_LIMITED"
+            ),
+            headers={"Retry-After": ratelimit.retry_after_header(retry_after)}
+        )
+
+@router.post("/update", response_model_exclude_none=True, dependencies=[Depends(enforce_user_rate_limit)])
+@traced("rewards.update")
+def update_rewards(
+    req: UpdateRewardsRequest,
+    idempotency_key: Annotated[Optional[str], Header(alias=idempotency.HEADER)] = None,
+):
+    """Update user rewards when they perform an eco-action.
+
+    Clients may send an `Idempotency-Key` header; a repeat with the same key and
+    payload returns the original response without touching storage.
+    """
+    if idempotency_key is None:
+        return _apply_reward_action(req)
+
+    idempotency_key = idempotency_key.strip()
+    if not idempotency_key or len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "success": False,
+                "status": "validation_error",
+                "message": f"{idempotency.HEADER} must be 1-{idempotency.MAX_KEY_LENGTH} characters",
+                "code": "INVALID_IDEMPOTENCY_KEY"
+            }
+        )
+
+    request_fingerprint = idempotency.fingerprint(req.model_dump())
+    conflict = HTTPException(
+        status_code=422,
+        detail={
+            "success": False,
+            "status": "idempotency_conflict",
+            "message": f"{idempotency.HEADER} was already used with a different request",
+            "code": "IDEMPOTENCY_KEY_REUSED"
+        }
+    )
+    try:
+        cached = idempotency_store.begin(req.user_id, idempotency_key, request_fingerprint)
+        if cached is None:
+            # Not seen by this process; the key may have been persisted before a restart
+            stored = store.get_user(req.user_id)
+            persisted = stored.get(idempotency.USER_FIELD) if stored is not None else None
+            cached = idempotency_store.replay_persisted(req.user_id, idempotency_key, request_fingerprint, persisted)
+    except idempotency.IdempotencyConflict:
+        raise conflict
+    except idempotency.IdempotencyInProgress:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "success": False,
+                "status": "in_progress",
+                "message": "A request with this Idempotency-Key is still being processed",
+                "code": "IDEMPOTENCY_IN_PROGRESS"
+            },
+            headers={"Retry-After": "1"}
+        )
+
+    if cached is not None:
+        return JSONResponse(content=cached, headers={"Idempotent-Replayed": "true"})
+
+    try:
+        charge_user_rate_limit(req.user_id)
+        response = _apply_reward_action(req, (idempotency_key, request_fingerprint))
+    except idempotency.IdempotencyConflict:
+        idempotency_store.abort(req.user_id, idempotency_key)
+        raise conflict
+    except BaseException:
+        idempotency_store.abort(req.user_id, idempotency_key)
+        raise
+    idempotency_store.complete(req.user_id, idempotency_key, request_fingerprint, response)
+    return response
+
+def _apply_reward_action(req: UpdateRewardsRequest, idempotency_record=None):
+    """Award points (and any new badges) for one action in a single save.
+
+    Runs under the DB write lock so concurrent updates from any thread or worker
+    process never compute points from a stale read.
+    """
+    with _db_write_lock():
+        if idempotency_record is not None:
+            # Another worker may have completed this key while we waited for the lock
+            key, request_fingerprint = idempotency_record
+            stored = store.get_user(req.user_id)
+            persisted = stored.get(idempotency.USER_FIELD) if stored is not None else None
+            entry = idempotency.prune_persisted(persisted).get(key)
+            if entry is not None:
+                if entry.get("fingerprint") != request_fingerprint:
+                    raise idempotency.IdempotencyConflict()
+                return entry.get("response")
+        return _award_action(req, idempotency_record)
+
+def _award_action(req: UpdateRewardsRequest, idempotency_record=None):
     try:
         # Validate request
         if not req.user_id:
@@ -362,19 +544,7 @@ def update_rewards(req: UpdateRewardsRequest):
             user = get_user_rewards(req.user_id)  # Retry
         
         # Calculate points for this action
-        base_points = ACTION_POINTS.get(req.action_type, 10)
-        if not isinstance(base_points, (int, float)):
-            base_points = 10
-        
-        try:
-            amount = float(req.amount) if req.amount is not None else 1.0
-            if amount < 0:
-                amount = 0
-            points_earned = int(base_points * amount)
-        except (ValueError, TypeError) as calc_error:
-            logger.warning(f"Invalid amount calculation: {calc_error}, using default")
-            amount = 1.0
-            points_earned = int(base_points * amount)
+        points_earned, amount = calculate_points(req.action_type, req.amount)
         
         # Safely get current points
         try:
@@ -395,46 +565,17 @@ def update_rewards(req: UpdateRewardsRequest):
         }
         
         # Safely handle actions list
-        actions = user.get("actions", [])
-        if not isinstance(actions, list):
-            actions = []
+        actions = list(user.get("actions", [])) if isinstance(user.get("actions"), list) else []
         actions.append(action)
+        actions = actions[-MAX_ACTION_HISTORY:]  # Keep last 100 actions
         
-        # Update user with error handling
-        try:
-            update_user_rewards(req.user_id, {
-                "ecoPoints": new_eco_points,
-                "rank": new_rank,
-                "actions": actions[-100:]  # Keep last 100 actions
-            })
-        except Exception as update_error:
-            logger.error(f"Failed to update user rewards: {update_error}")
-            raise HTTPException(
-                status_code=503,
-                detail={
-                    "success": False,
-                    "status": "database_error",
-                    "message": "Failed to save rewards. Points may not have been updated.",
-                    "code": "DB_UPDATE_ERROR"
-                }
-            )
-        
-        # Check for new badges with error handling
+        # Check for new badges against the updated user so they are saved in the same write
         new_badges = []
+        current_badges = list(user.get("badges", [])) if isinstance(user.get("badges"), list) else []
         try:
-            user = get_user_rewards(req.user_id)  # Reload
-            new_badges = check_badge_eligibility(req.user_id, new_eco_points, req.action_type)
-            
-            if new_badges:
-                current_badges = user.get("badges", [])
-                if not isinstance(current_badges, list):
-                    current_badges = []
-                current_badges.extend(new_badges)
-                try:
-                    update_user_rewards(req.user_id, {"badges": current_badges})
-                except Exception as badge_error:
-                    logger.error(f"Failed to save new badges: {badge_error}")
-                    # Don't fail the whole request if badge save fails
+            new_badges = evaluate_badges(
+                {"badges": current_badges, "actions": actions}, new_eco_points, req.action_type
+            )
         except Exception as badge_check_error:
             logger.error(f"Error checking badge eligibility: {badge_check_error}")
             # Continue without badges if check fails
@@ -445,9 +586,7 @@ def update_rewards(req: UpdateRewardsRequest):
             if bid in BADGE_DEFINITIONS:
                 badge_details.append(BADGE_DEFINITIONS[bid])
         
-        logger.info(f"Successfully updated rewards for {req.user_id}: +{points_earned} points")
-        
-        return {
+        response = {
             "success": True,
             "points_earned": points_earned,
             "total_points": new_eco_points,
@@ -455,6 +594,44 @@ def update_rewards(req: UpdateRewardsRequest):
             "new_badges": badge_details,
             "action": action
         }
+        
+        stats = copy_stats(user_stats(user))
+        add_action_to_stats(stats, req.action_type, amount, points_earned)
+
+        updates = {
+            "ecoPoints": new_eco_points,
+            "rank": new_rank,
+            "actions": actions,
+            "badges": current_badges + new_badges,
+            STATS_FIELD: stats
+        }
+        if idempotency_record is not None:
+            key, request_fingerprint = idempotency_record
+            stored = store.get_user(req.user_id)
+            persisted = stored.get(idempotency.USER_FIELD) if stored is not None else None
+            persisted = dict(idempotency.prune_persisted(persisted))
+            persisted[key] = idempotency.IdempotencyStore.persisted_entry(request_fingerprint, response)
+            updates[idempotency.USER_FIELD] = idempotency.prune_persisted(persisted)
+        
+        # Update user with error handling
+        try:
+            update_user_rewards(req.user_id, updates)
+        except Exception as update_error:
+            logger.error(f"Failed to update user rewards: {update_error}")
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "success": False,
+                    "status": "database_error",
+                    "message": "Failed to save rewards. Points may not have been updated.",
+                    "code": "DB_UPDATE_ERROR"
+                }
+            )
+        
+        log_success(logger, "rewards.update", "Rewards updated",
+                    user_id=req.user_id, points_earned=points_earned, total_points=new_eco_points)
+        
+        return response
     except HTTPException:
         raise
     except ValueError as ve:
@@ -469,8 +646,7 @@ def update_rewards(req: UpdateRewardsRequest):
             }
         )
     except Exception as e:
-        logger.error(f"Unexpected error in update_rewards: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Unexpected error in update_rewards: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail={
@@ -483,8 +659,19 @@ def update_rewards(req: UpdateRewardsRequest):
         )
 
 @router.get("/leaderboard")
-def get_leaderboard(limit: int = 100, region: Optional[str] = None):
-    """Get global or regional leaderboard"""
+@traced("rewards.leaderboard")
+def get_leaderboard(
+    limit: int = 100,
+    region: Optional[str] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+    response: Response = None,
+):
+    """Get global or regional leaderboard.
+
+    Built from the rank index, so a request costs `limit` rows rather than a
+    sort of the whole DB. Tagged with an ETag of the DB version; a matching
+    If-None-Match gets a 304 without the leaderboard being built.
+    """
     try:
         # Validate limit
         if limit < 1:
@@ -492,9 +679,9 @@ def get_leaderboard(limit: int = 100, region: Optional[str] = None):
         if limit > 1000:
             limit = 1000  # Cap at 1000 for performance
         
-        # Load database with error handling
+        # Version first: a body newer than its tag is only revalidated once too often
         try:
-            db = load_rewards_db()
+            version = store.current_version()
         except Exception as db_error:
             logger.error(f"Database error loading leaderboard: {db_error}")
             raise HTTPException(
@@ -506,64 +693,46 @@ def get_leaderboard(limit: int = 100, region: Optional[str] = None):
                     "code": "DB_LOAD_ERROR"
                 }
             )
-        
-        if not isinstance(db, dict):
-            logger.warning("Invalid database structure, returning empty leaderboard")
-            return {
-                "success": True,
-                "leaderboard": [],
-                "region": region or "global",
-                "total_users": 0
-            }
-        
-        # Convert to list and sort by points with error handling
+
+        etag = http_cache.make_etag("lb", version, limit, region or "global") if version is not None else None
+        if if_none_match is not None:
+            matched = http_cache.etag_matches(if_none_match, etag)
+            metrics.record_cache("leaderboard_etag", matched)
+            if matched:
+                return http_cache.not_modified(etag)
+        if etag is not None and response is not None:
+            response.headers["ETag"] = etag
+
+        # The first `limit` positions from the rank index, in the order profiles report
+        # (points, then badge count, descending; then insertion order); `region` is not
+        # stored, so every region is the global board
         users = []
-        for user_id, user_data in db.items():
-            try:
-                if not isinstance(user_data, dict):
-                    continue
-                
-                # Safely extract data with defaults
-                eco_points = int(user_data.get("ecoPoints", 0)) if isinstance(user_data.get("ecoPoints"), (int, float)) else 0
-                rank = int(user_data.get("rank", 0)) if isinstance(user_data.get("rank"), (int, float)) else 0
-                badges = list(user_data.get("badges", [])) if isinstance(user_data.get("badges"), list) else []
-                
-                users.append({
-                    "user_id": str(user_id),
-                    "ecoPoints": eco_points,
-                    "rank": rank,
-                    "badges": badges,
-                    "badge_count": len(badges)
-                })
-            except Exception as user_error:
-                logger.warning(f"Error processing user {user_id} for leaderboard: {user_error}")
-                continue
-        
-        # Sort by points (descending) with error handling
-        try:
-            users.sort(key=lambda x: (x.get("ecoPoints", 0), x.get("badge_count", 0)), reverse=True)
-        except Exception as sort_error:
-            logger.error(f"Error sorting leaderboard: {sort_error}")
-            # Return unsorted if sort fails
-            pass
-        
-        # Add position
-        for i, user in enumerate(users[:limit]):
-            user["position"] = i + 1
-        
-        logger.info(f"Successfully loaded leaderboard: {len(users)} users, limit={limit}")
-        
+        for position, (user_id, user_data) in enumerate(store.top(limit), start=1):
+            eco_points = int(user_data.get("ecoPoints", 0)) if isinstance(user_data.get("ecoPoints"), (int, float)) else 0
+            rank = int(user_data.get("rank", 0)) if isinstance(user_data.get("rank"), (int, float)) else 0
+            badges = list(user_data.get("badges", [])) if isinstance(user_data.get("badges"), list) else []
+            users.append({
+                "user_id": str(user_id),
+                "ecoPoints": eco_points,
+                "rank": rank,
+                "badges": badges,
+                "badge_count": len(badges),
+                "position": position
+            })
+        total_users = len(store.rank_index)
+
+        log_success(logger, "rewards.leaderboard", "Leaderboard loaded", users=total_users, limit=limit)
+
         return {
             "success": True,
-            "leaderboard": users[:limit],
+            "leaderboard": users,
             "region": region or "global",
-            "total_users": len(users)
+            "total_users": total_users
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in get_leaderboard: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Unexpected error in get_leaderboard: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail={
@@ -575,8 +744,17 @@ def get_leaderboard(limit: int = 100, region: Optional[str] = None):
         )
 
 @router.get("/user/{user_id}")
-def get_user_rewards_data(user_id: str):
-    """Get user's rewards data"""
+@traced("rewards.user")
+def get_user_rewards_data(
+    user_id: str,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+    response: Response = None,
+):
+    """Get user's rewards data.
+
+    Tagged with an ETag of the user's record version and leaderboard
+    position; a matching If-None-Match gets a 304 without a body.
+    """
     try:
         # Validate user_id
         if not user_id or not isinstance(user_id, str) or len(user_id.strip()) == 0:
@@ -611,65 +789,33 @@ def get_user_rewards_data(user_id: str):
             logger.warning(f"Invalid user data structure for {user_id}")
             user = {}
         
-        # Get badge details with error handling
-        badge_details = []
-        try:
-            badges = user.get("badges", [])
-            if not isinstance(badges, list):
-                badges = []
-            
-            for badge_id in badges:
-                if isinstance(badge_id, str) and badge_id in BADGE_DEFINITIONS:
-                    badge_details.append({
-                        "id": badge_id,
-                        **BADGE_DEFINITIONS[badge_id]
-                    })
-        except Exception as badge_error:
-            logger.warning(f"Error processing badges for {user_id}: {badge_error}")
-        
-        # Calculate stats with error handling
-        try:
-            actions = user.get("actions", [])
-            if not isinstance(actions, list):
-                actions = []
-            
-            total_actions = len(actions)
-            carbon_offset = 0.0
-            
-            for action in actions:
-                if isinstance(action, dict):
-                    if action.get("type") == "carbon_offset":
-                        try:
-                            amount = float(action.get("amount", 0))
-                            if amount > 0:
-                                carbon_offset += amount
-                        except (ValueError, TypeError):
-                            pass
-        except Exception as stats_error:
-            logger.warning(f"Error calculating stats for {user_id}: {stats_error}")
-            total_actions = 0
-            carbon_offset = 0.0
-            actions = []
-        
-        # Get leaderboard position with error handling
+        # Leaderboard position from the rank index (rebuilt only when the DB changed elsewhere)
         position = None
         try:
-            db = load_rewards_db()
-            if isinstance(db, dict):
-                all_users = []
-                for uid, data in db.items():
-                    if isinstance(data, dict):
-                        try:
-                            points = int(data.get("ecoPoints", 0)) if isinstance(data.get("ecoPoints"), (int, float)) else 0
-                            all_users.append((str(uid), points))
-                        except (ValueError, TypeError):
-                            continue
-                
-                all_users.sort(key=lambda x: x[1], reverse=True)
-                position = next((i + 1 for i, (uid, _) in enumerate(all_users) if uid == user_id), None)
+            position = store.position(user_id)
         except Exception as pos_error:
             logger.warning(f"Error calculating position for {user_id}: {pos_error}")
         
+        # The record version changes on every write to this user; the position covers everyone else's
+        etag = http_cache.make_etag("user", user_id, record_version(user), user.get("updated_at"), position)
+        if if_none_match is not None:
+            matched = http_cache.etag_matches(if_none_match, etag)
+            metrics.record_cache("user_etag", matched)
+            if matched:
+                return http_cache.not_modified(etag)
+        if response is not None:
+            response.headers["ETag"] = etag
+        
+        badges = user.get("badges", [])
+        badge_details = [
+            BADGE_DETAILS[badge_id] for badge_id in (badges if isinstance(badges, list) else [])
+            if isinstance(badge_id, str) and badge_id in BADGE_DETAILS
+        ]
+        stats = user_stats(user)
+        actions = user.get("actions", [])
+        if not isinstance(actions, list):
+            actions = []
+        
         # Safely get user values
         eco_points = int(user.get("ecoPoints", 0)) if isinstance(user.get("ecoPoints"), (int, float)) else 0
         rank = int(user.get("rank", 0)) if isinstance(user.get("rank"), (int, float)) else 0
@@ -685,17 +831,17 @@ def get_user_rewards_data(user_id: str):
             "position": position,
             "badges": badge_details,
             "stats": {
-                "total_actions": total_actions,
-                "carbon_offset_tons": round(carbon_offset, 2),
-                "badge_count": len(badge_details)
+                "total_actions": stats["total_actions"],
+                "carbon_offset_tons": round(stats["carbon_offset_tons"], 2),
+                "badge_count": len(badge_details),
+                "by_type": stats["by_type"]
             },
             "recent_actions": recent_actions
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in get_user_rewards_data: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Unexpected error in get_user_rewards_data: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail={
@@ -706,6 +852,81 @@ def get_user_rewards_data(user_id: str):
             }
         )
 
+@router.get("/export", dependencies=[Depends(require_admin)])
+def export_rewards(
+    fmt: str = Query("ndjson", alias="format", description="ndjson or csv"),
+    gzip: bool = Query(False, description="Compress the download with gzip"),
+    updated_since: Optional[str] = Query(None, description="ISO 8601; only users updated after this"),
+):
+    """Stream users and their actions for analytics.
+
+    Rows are generated from a consistent in-memory snapshot in constant memory.
+    For incremental exports, pass the previous response's `X-Export-Snapshot-At`
+    header as `updated_since`. Admin only, like the profiler routes.
+    """
+    if fmt not in export.FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "success": False,
+                "status": "validation_error",
+                "message": f"Invalid format. Must be one of: {', '.join(export.FORMATS)}",
+                "code": "INVALID_EXPORT_FORMAT"
+            }
+        )
+
+    since = None
+    if updated_since:
+        try:
+            parsed = datetime.fromisoformat(updated_since.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "success": False,
+                    "status": "validation_error",
+                    "message": "updated_since must be an ISO 8601 timestamp",
+                    "code": "INVALID_UPDATED_SINCE"
+                }
+            )
+        # Stored timestamps are naive local time
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        since = parsed.isoformat()
+
+    try:
+        # Writers stamp updated_at under the write lock, so every record stamped
+        # at or before snapshot_at is in the snapshot and the next incremental
+        # export starting from it misses nothing
+        with _db_write_lock():
+            snapshot = load_rewards_db()
+            snapshot_at = datetime.now().isoformat()
+    except Exception as db_error:
+        logger.error(f"Database error loading export snapshot: {db_error}")
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "success": False,
+                "status": "database_error",
+                "message": "Failed to load rewards data for export. Please try again.",
+                "code": "DB_LOAD_ERROR"
+            }
+        )
+
+    media_type, extension = export.FORMATS[fmt]
+    filename = f"rewards-export-{snapshot_at[:19].replace(':', '')}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        export.stream_export(snapshot, fmt, since, compress=gzip),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Snapshot-At": snapshot_at,
+        }
+    )
+
 @router.get("/badges")
 def get_badge_definitions():
     """Get all available badge definitions"""
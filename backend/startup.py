@@ -0,0 +1,169 @@
+"""
+Startup lifecycle: import timing and the warm-up phase.
+
+`main.py` records how long importing the app took. Its lifespan hook then
+runs the registered warm-up steps (loading the rewards DB, building the rank
+index, preparing the calculator tables) so the first real requests do not pay
+for them. Steps run in a background thread by default, so `/health` answers
+while a large DB is parsed, and `/ready` reports 503 until warm-up finishes.
+
+`STARTUP_WARMUP`: `background` (default), `blocking` (finish before serving)
+or `off`. `STARTUP_BUDGET_SECONDS` (default 5) is the time-to-ready budget
+from the start of the app import; exceeding it logs a warning and is visible
+in `carbonx_startup_seconds` and the `/ready` body.
+"""
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODE = os.getenv("STARTUP_WARMUP", "background").lower()
+try:
+    STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+except ValueError:
+    STARTUP_BUDGET_SECONDS = 5.0
+
+
+def process_uptime():
+    """Seconds since this process was exec'd (Linux only; None elsewhere)"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # Field 22 is the start time in clock ticks after boot; the name field may contain spaces
+            fields = f.read().rsplit(b")", 1)[1].split()
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Warmup:
+    """Ordered warm-up steps plus the progress report served by `/ready`"""
+
+    def __init__(self, budget_seconds: float = STARTUP_BUDGET_SECONDS):
+        self.budget_seconds = budget_seconds
+        self.state = "not_started"  # not_started -> running -> ready
+        self.import_seconds = None
+        self.warmup_seconds = None
+        self.process_seconds_at_ready = None
+        self.current_step = None
+        self._steps = []
+        self._results = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def add_step(self, name: str, func):
+        self._steps.append((name, func))
+
+    def record_import(self, seconds: float):
+        self.import_seconds = seconds
+        logger.info(f"App imported in {seconds * 1000:.0f} ms")
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def total_seconds(self):
+        if self.warmup_seconds is None:
+            return None
+        return (self.import_seconds or 0.0) + self.warmup_seconds
+
+    def start(self, mode: str = WARMUP_MODE):
+        """Begin warm-up; called from the app lifespan"""
+        with self._lock:
+            if self.state != "not_started":
+                return
+            self.state = "running"
+        if mode == "off":
+            self._steps = []
+        if mode == "blocking" or not self._steps:
+            self.run()
+        else:
+            threading.Thread(target=self.run, name="carbonx-warmup", daemon=True).start()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def run(self):
+        started = time.perf_counter()
+        total = len(self._steps)
+        for number, (name, func) in enumerate(self._steps, 1):
+            self.current_step = name
+            step_started = time.perf_counter()
+            result = {"name": name, "ok": True}
+            try:
+                detail = func()
+                if detail is not None:
+                    result["detail"] = detail
+            except Exception as e:
+                # Warm-up only saves latency; a failed step is retried lazily by the first request
+                result["ok"] = False
+                result["error"] = str(e)[:200]
+                logger.warning(f"Warm-up step {name} failed: {e}")
+            result["seconds"] = round(time.perf_counter() - step_started, 4)
+            with self._lock:
+                self._results.append(result)
+            logger.info(f"Warm-up {number}/{total}: {name} done in {result['seconds'] * 1000:.0f} ms")
+
+        self.current_step = None
+        self.warmup_seconds = time.perf_counter() - started
+        self.process_seconds_at_ready = process_uptime()
+        self.state = "ready"
+        self._done.set()
+
+        total_seconds = self.total_seconds
+        message = (f"Startup complete: import {(self.import_seconds or 0) * 1000:.0f} ms, "
+                   f"warm-up {self.warmup_seconds * 1000:.0f} ms")
+        if self.budget_seconds > 0 and total_seconds > self.budget_seconds:
+            logger.warning(f"{message}; over the {self.budget_seconds:.1f} s startup budget")
+        else:
+            logger.info(message)
+
+    def status(self) -> dict:
+        with self._lock:
+            steps = list(self._results)
+        total_seconds = self.total_seconds
+        return {
+            "state": self.state,
+            "current_step": self.current_step,
+            "steps_done": len(steps),
+            "steps_total": len(self._steps),
+            "steps": steps,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "total_seconds": total_seconds,
+            "process_seconds_at_ready": self.process_seconds_at_ready,
+            "budget_seconds": self.budget_seconds,
+            "within_budget": None if total_seconds is None else (
+                self.budget_seconds <= 0 or total_seconds <= self.budget_seconds),
+        }
+
+
+warmup = Warmup()
+
+
+def _startup_seconds():
+    values = {}
+    for phase, seconds in (("import", warmup.import_seconds), ("warmup", warmup.warmup_seconds),
+                           ("total", warmup.total_seconds), ("process", warmup.process_seconds_at_ready)):
+        if seconds is not None:
+            values[(phase,)] = seconds
+    return values
+
+
+metrics.REGISTRY.gauge(
+    "carbonx_startup_seconds",
+    "Startup time by phase (import, warmup, total; process = since exec, at ready)",
+    ("phase",),
+    callback=_startup_seconds,
+)
+metrics.REGISTRY.gauge(
+    "carbonx_startup_ready",
+    "1 once the startup warm-up has finished",
+    callback=lambda: {(): 1 if warmup.ready else 0},
+)
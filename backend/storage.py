@@ -0,0 +1,499 @@
+"""
+Rewards storage backends.
+
+`RewardsStore` is the contract the rewards code is written against:
+
+- whole-DB snapshots (`load`, `save`, `write_lock`, `version`) for exports
+  and bulk imports. A snapshot is a copy-on-write dict: callers treat it as
+  read-only and writers save a new dict;
+- per-user operations built on them: `get_user`, `put_user`,
+  `increment_points`, `append_action`, and the rank queries `position` /
+  `top` that the profile and leaderboard endpoints use. Every `put_user`
+  bumps the record's `version` field;
+- `health()` for the readiness probe and `describe()` for the debug endpoint.
+
+Two backends implement it:
+
+- `FileStore`: the durable JSON file (`rewards_db.json`). The parsed file is
+  cached while its signature is unchanged, writes are atomic and serialized
+  across threads and worker processes (see `file_lock`), and a corrupted or
+  missing primary is rebuilt from the newest checkpoint.
+- `MemoryStore`: a dict in process memory, for tests and benchmarks, updated
+  in place per user. Nothing survives a restart and every worker process has
+  its own copy.
+
+`tests/test_storage.py` runs the same conformance tests against both, and
+`python -m benchmarks.run --mode storage` times them under one workload.
+"""
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+import checkpoint
+import file_lock
+import leaderboard
+import metrics
+from profiler import span
+
+logger = logging.getLogger(__name__)
+
+# Field on the user record counting its writes
+VERSION_FIELD = "version"
+
+
+def record_version(user) -> int:
+    version = user.get(VERSION_FIELD, 0) if isinstance(user, dict) else 0
+    return int(version) if isinstance(version, (int, float)) else 0
+
+
+def _points(user) -> int:
+    points = user.get("ecoPoints", 0)
+    return int(points) if isinstance(points, (int, float)) else 0
+
+
+class RewardsStore:
+    """Storage contract; subclasses implement the snapshot primitives"""
+
+    name = None
+
+    def __init__(self):
+        # Leaderboard positions for the current snapshot
+        self.rank_index = leaderboard.RankIndex()
+
+    # -------------------------
+    # Backend primitives
+    # -------------------------
+    def load(self) -> dict:
+        """Current snapshot of all users; read-only, copy before mutating"""
+        raise NotImplementedError
+
+    def save(self, data: dict, changed_users=None):
+        """Replace the DB with `data`.
+
+        `changed_users` lists the user ids that differ from the current
+        snapshot, letting the rank index update in place instead of being rebuilt.
+        """
+        raise NotImplementedError
+
+    def write_lock(self):
+        """Context manager serializing read-modify-write cycles; re-entrant within a thread"""
+        raise NotImplementedError
+
+    def version(self, data: dict):
+        """Opaque version of snapshot `data`, or None if it is not the current snapshot"""
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Drop cached state so the next load reads the backing store"""
+
+    def health(self) -> dict:
+        """`{"ok": bool, "reason": str or None}` for the readiness probe"""
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        return {"backend": self.name}
+
+    def current_version(self):
+        """Version of the current snapshot"""
+        return self.version(self.load())
+
+    def prepare(self) -> int:
+        """Build the rank index ahead of the first query; returns the user count"""
+        db = self.load()
+        self.rank_index.prepare(db, self.version)
+        return len(db)
+
+    # -------------------------
+    # Operations
+    # -------------------------
+    def get_user(self, user_id: str):
+        """Stored record of `user_id` (read-only), or None"""
+        user = self.load().get(user_id)
+        return user if isinstance(user, dict) else None
+
+    def put_user(self, user_id: str, record: dict) -> dict:
+        """Store `record` as `user_id` with its version bumped; returns the stored record"""
+        with self.write_lock():
+            db = self.load()
+            record = dict(record)
+            record[VERSION_FIELD] = record_version(db.get(user_id)) + 1
+            db = dict(db)  # copy-on-write: the loaded snapshot is shared
+            db[user_id] = record
+            self.save(db, changed_users=(user_id,))
+            return record
+
+    def _modify_user(self, user_id: str, change) -> dict:
+        with self.write_lock():
+            user = self.get_user(user_id)
+            if user is None:
+                raise KeyError(user_id)
+            user = dict(user)
+            change(user)
+            user["updated_at"] = datetime.now().isoformat()
+            return self.put_user(user_id, user)
+
+    def increment_points(self, user_id: str, delta: int) -> int:
+        """Atomically add `delta` to the user's ecoPoints; returns the new total"""
+        def change(user):
+            user["ecoPoints"] = _points(user) + int(delta)
+        return self._modify_user(user_id, change)["ecoPoints"]
+
+    def append_action(self, user_id: str, action: dict, max_history: int) -> int:
+        """Append to the user's action history, keeping the last `max_history`; returns its length"""
+        def change(user):
+            actions = user.get("actions")
+            actions = list(actions) if isinstance(actions, list) else []
+            actions.append(action)
+            user["actions"] = actions[-max_history:]
+        return len(self._modify_user(user_id, change)["actions"])
+
+    def position(self, user_id: str):
+        """1-based leaderboard position of `user_id`, or None"""
+        return self.rank_index.position(self.load(), user_id, self.version)
+
+    def top(self, limit: int) -> list:
+        """`(user_id, record)` pairs for the first `limit` positions"""
+        return self.rank_index.top(self.load(), limit, self.version)
+
+    def count(self) -> int:
+        return len(self.load())
+
+
+class MemoryStore(RewardsStore):
+    """Users held in process memory.
+
+    Writes update one live dict in place under the lock, so a `put_user` costs
+    the same at any DB size. `load()` hands out a copy of it, made at most once
+    per write generation and only when a whole-DB snapshot is asked for.
+    """
+
+    name = "memory"
+
+    def __init__(self, data: dict = None):
+        super().__init__()
+        self._lock = threading.RLock()
+        self._data = dict(data or {})
+        self._generation = 0
+        # (generation, copy of _data) handed out by load(), replaced as one value
+        self._snapshot = (None, None)
+
+    def load(self) -> dict:
+        with self._lock:
+            generation, snapshot = self._snapshot
+            if generation != self._generation:
+                snapshot = dict(self._data)
+                self._snapshot = (self._generation, snapshot)
+            return snapshot
+
+    def save(self, data: dict, changed_users=None):
+        if not isinstance(data, dict):
+            raise ValueError("Data must be a dictionary")
+        with self._lock:
+            previous = self._data
+            self._data = dict(data)
+            self._generation += 1
+            # The caller's dict is already a snapshot of the new state
+            self._snapshot = (self._generation, data)
+            if changed_users is None:
+                self.rank_index.invalidate()
+            else:
+                self.rank_index.apply(previous, self._data, changed_users)
+        return True
+
+    def write_lock(self):
+        return self._lock
+
+    def version(self, data: dict):
+        with self._lock:
+            generation, snapshot = self._snapshot
+            return generation if snapshot is data and generation == self._generation else None
+
+    def current_version(self):
+        return self._generation
+
+    def get_user(self, user_id: str):
+        user = self._data.get(user_id)
+        return user if isinstance(user, dict) else None
+
+    def put_user(self, user_id: str, record: dict) -> dict:
+        with self._lock:
+            record = dict(record)
+            record[VERSION_FIELD] = record_version(self._data.get(user_id)) + 1
+            self._data[user_id] = record
+            self._generation += 1
+            self.rank_index.apply(self._data, self._data, (user_id,))
+            return record
+
+    def prepare(self) -> int:
+        with self._lock:
+            self.rank_index.prepare(self._data)
+            return len(self._data)
+
+    def position(self, user_id: str):
+        with self._lock:
+            return self.rank_index.position(self._data, user_id)
+
+    def top(self, limit: int) -> list:
+        with self._lock:
+            return self.rank_index.top(self._data, limit)
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def health(self) -> dict:
+        return {"ok": True, "reason": None}
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "generation": self._generation}
+
+
+class FileStore(RewardsStore):
+    """Users in a JSON file shared by all worker processes"""
+
+    name = "file"
+
+    def __init__(self, path_getter, checkpointer: checkpoint.Checkpointer = None):
+        super().__init__()
+        # Resolved on every call so the path can be changed at runtime (tests, tools)
+        self._path_getter = path_getter
+        self.checkpointer = checkpointer
+        # Parsed DB cache as one (signature, data) pair, replaced in a single
+        # assignment so readers never see one half updated without the other;
+        # and the lock guarding writes (the in-process half; file_lock adds
+        # the cross-process half)
+        self._cache = (None, None)
+        self._lock = threading.Lock()
+        self._lock_state = threading.local()
+
+    @property
+    def path(self) -> str:
+        return self._path_getter()
+
+    @staticmethod
+    def _file_signature(path):
+        """Identity of the DB file on disk; changes whenever any worker rewrites it"""
+        generation = file_lock.read_generation(file_lock.lock_path_for(path))
+        st = os.stat(path)
+        return (generation, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _holds_write_lock(self) -> bool:
+        return getattr(self._lock_state, "depth", 0) > 0
+
+    @contextmanager
+    def write_lock(self):
+        """Serialize read-modify-write cycles on the DB across threads and
+        worker processes, and record lock wait. Re-entrant within a thread."""
+        if self._holds_write_lock():
+            self._lock_state.depth += 1
+            try:
+                yield
+            finally:
+                self._lock_state.depth -= 1
+            return
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            with span("rewards_db.lock_wait"):
+                self._lock.acquire()
+                stack.callback(self._lock.release)
+                stack.enter_context(file_lock.FileLock(file_lock.lock_path_for(self.path)))
+            metrics.STORAGE_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+            self._lock_state.depth = 1
+            try:
+                yield
+            finally:
+                self._lock_state.depth = 0
+
+    def _read_file(self, path):
+        """Raw DB bytes and the signature they were read at, excluding concurrent
+        writers in other processes"""
+        with ExitStack() as stack:
+            if not self._holds_write_lock():
+                stack.enter_context(file_lock.FileLock(file_lock.lock_path_for(path), shared=True))
+            with open(path, 'rb') as f:
+                return self._file_signature(path), f.read()
+
+    def invalidate(self):
+        self._cache = (None, None)
+        self.rank_index.invalidate()
+        file_lock.release_generation_fds()
+
+    def _load_file(self, path):
+        """Parsed DB from the cache or the file; None if it is not a JSON object"""
+        signature = self._file_signature(path)
+        cached_signature, cached = self._cache
+        if cached is not None and cached_signature == signature:
+            metrics.record_cache("rewards_db", True)
+            return cached
+        metrics.record_cache("rewards_db", False)
+
+        with metrics.STORAGE_LOAD_SECONDS.time(), span("rewards_db.read"):
+            signature, raw = self._read_file(path)
+        metrics.STORAGE_BYTES_READ.inc(amount=len(raw))
+        with metrics.STORAGE_PARSE_SECONDS.time(), span("rewards_db.parse"):
+            data = json.loads(raw)
+        if not isinstance(data, dict):
+            return None
+        # Publish under the lock saves publish with, and never over a newer snapshot
+        # a writer published while this one was being parsed
+        with self.rank_index.lock:
+            if self._cache[1] is cached:
+                self._cache = (signature, data)
+        return data
+
+    def load(self) -> dict:
+        """Load the DB from file or return an empty dict.
+
+        The parsed DB is cached and reused while the file on disk is unchanged.
+        """
+        try:
+            path = self.path
+            if os.path.exists(path):
+                try:
+                    data = self._load_file(path)
+                    # Validate data structure
+                    if data is None:
+                        logger.warning("Rewards DB file contains invalid data structure, resetting")
+                        return {}
+                    return data
+                except json.JSONDecodeError as e:
+                    metrics.STORAGE_ERRORS.inc("load")
+                    logger.error(f"Failed to parse rewards DB JSON: {e}")
+                    return self._recover(corrupted=True)
+                except Exception as e:
+                    metrics.STORAGE_ERRORS.inc("load")
+                    logger.error(f"Unexpected error loading rewards DB: {e}")
+                    return {}
+            if checkpoint.list_checkpoints(path):
+                return self._recover(corrupted=False)
+            self.invalidate()
+            return {}
+        except Exception as e:
+            logger.error(f"Critical error loading rewards DB: {e}")
+            return {}
+
+    def _recover(self, corrupted: bool):
+        """Set a corrupted primary aside and rebuild it from the newest checkpoint"""
+        try:
+            with self.write_lock():
+                path = self.path
+                if corrupted and os.path.exists(path):
+                    try:
+                        json.loads(self._read_file(path)[1])
+                        # Another thread or worker already replaced the file
+                        return self.load()
+                    except json.JSONDecodeError:
+                        pass
+                    # Backup corrupted file
+                    backup_file = f"{path}.backup.{datetime.now().timestamp()}"
+                    try:
+                        os.rename(path, backup_file)
+                        logger.info(f"Backed up corrupted DB to {backup_file}")
+                    except OSError:
+                        pass
+                elif os.path.exists(path):
+                    return self.load()
+
+                self.invalidate()
+                data = checkpoint.restore_latest(path)
+                if data is None:
+                    return {}
+                file_lock.bump_generation(file_lock.lock_path_for(path))
+                self._cache = (self._file_signature(path), data)
+                return data
+        except Exception as e:
+            metrics.STORAGE_ERRORS.inc("restore")
+            logger.error(f"Failed to restore rewards DB from checkpoint: {e}")
+            return {}
+
+    def save(self, data: dict, changed_users=None):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Data must be a dictionary")
+
+            with self.write_lock(), metrics.STORAGE_SAVE_SECONDS.time():
+                path = self.path
+                # Write new data: temp file + fsync + rename, so a crash never leaves a torn primary.
+                # Backups are point-in-time checkpoints taken in the background (see checkpoint.py)
+                with span("rewards_db.serialize"):
+                    payload = checkpoint.serialize_db(data)
+                try:
+                    with span("rewards_db.write"):
+                        checkpoint.atomic_write(path, payload)
+                except Exception:
+                    self.invalidate()
+                    raise
+                metrics.STORAGE_BYTES_WRITTEN.inc(amount=len(payload))
+                metrics.STORAGE_WRITE_SIZE.observe(len(payload))
+                if self.checkpointer is not None:
+                    self.checkpointer.notify_write(len(payload))
+
+                # Tell other worker processes their cached copy is stale
+                file_lock.bump_generation(file_lock.lock_path_for(path))
+                signature = self._file_signature(path)
+                # Publish and re-index as one step, so no query sees the new
+                # snapshot before the index has moved to it
+                with self.rank_index.lock:
+                    previous_signature, previous = self._cache
+                    self._cache = (signature, data)
+                    if changed_users is None:
+                        self.rank_index.invalidate()
+                    else:
+                        self.rank_index.apply(previous, data, changed_users,
+                                              version=signature, previous_version=previous_signature)
+
+            logger.debug("Successfully saved rewards DB")
+            return True
+        except PermissionError as e:
+            metrics.STORAGE_ERRORS.inc("save")
+            logger.error(f"Permission denied saving rewards DB: {e}")
+            raise
+        except Exception as e:
+            metrics.STORAGE_ERRORS.inc("save")
+            logger.error(f"Error saving rewards DB: {e}", exc_info=True)
+            raise
+
+    def version(self, data: dict):
+        """The file signature `data` was loaded with; it includes the write
+        generation every save bumps, so it is the same in every worker process"""
+        signature, cached = self._cache
+        return signature if cached is data else None
+
+    def health(self) -> dict:
+        """Whether the file exists and parses; served from the cache while it is unchanged"""
+        path = self.path
+        if not os.path.exists(path):
+            return {"ok": False, "reason": "file_not_found"}
+        try:
+            if self._load_file(path) is None:
+                return {"ok": False, "reason": "read_error: invalid data structure"}
+        except Exception as e:
+            return {"ok": False, "reason": f"read_error: {str(e)[:200]}"}
+        return {"ok": True, "reason": None}
+
+    def describe(self) -> dict:
+        path = self.path
+        exists = os.path.exists(path)
+        return {
+            "backend": self.name,
+            "path": os.path.abspath(path),
+            "file_exists": exists,
+            "file_size_bytes": os.path.getsize(path) if exists else 0,
+            "generation": file_lock.read_generation(file_lock.lock_path_for(path)) if exists else 0,
+        }
+
+
+BACKENDS = {"file": FileStore, "memory": MemoryStore}
+
+
+def create_store(backend: str, path_getter, checkpointer: checkpoint.Checkpointer = None) -> RewardsStore:
+    """Store for a `REWARDS_STORAGE` backend name"""
+    if backend == "file":
+        return FileStore(path_getter, checkpointer)
+    if backend == "memory":
+        return MemoryStore()
+    raise ValueError(f"Unknown rewards storage backend '{backend}'. Must be one of: {', '.join(BACKENDS)}")
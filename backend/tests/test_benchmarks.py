@@ -0,0 +1,41 @@
+# backend/tests/test_benchmarks.py
+import json
+import os
+import sys
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import datagen, run
+
+
+def test_generated_dataset_is_deterministic():
+    assert datagen.generate_db(20, seed=7) == datagen.generate_db(20, seed=7)
+    assert datagen.parse_size("100k") == 100_000
+    assert datagen.parse_size("1m") == 1_000_000
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert run.percentile(values, 50) == 50
+    assert run.percentile(values, 99) == 99
+    assert run.percentile([], 99) == 0.0
+
+
+def test_inprocess_smoke_run_and_baseline_compare(tmp_path):
+    output = tmp_path / "results.json"
+    code = run.main([
+        "--sizes", "50", "--mode", "inprocess", "--duration", "0.01", "--min-iterations", "2",
+        "--cache-dir", str(tmp_path / "data"), "--output", str(output),
+    ])
+    assert code == 0
+    report = json.loads(output.read_text())
+    ops = {row["op"] for row in report["results"]}
+    assert {"update_rewards", "get_leaderboard", "get_user_rewards_data", "ready", "credits_price"} <= ops
+    assert all(row["errors"] == 0 for row in report["results"])
+
+    slower = {"results": [dict(row, p50_ms=row["p50_ms"] * 10, p99_ms=row["p99_ms"] * 10) for row in report["results"]]}
+    assert run.compare(slower["results"], report, tolerance=0.2)
+    assert run.compare(report["results"], report, tolerance=0.2) == []
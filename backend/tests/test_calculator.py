@@ -0,0 +1,88 @@
+# backend/tests/test_calculator.py
+import os
+import random
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+import emissions
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    emissions.result_cache.clear()
+    yield
+    emissions.result_cache.clear()
+
+
+def _item(industry, *values):
+    return {"industry": industry, "inputs": dict(zip(emissions.INDUSTRY_DATA[industry]["parameters"], values))}
+
+
+def test_vectorized_results_match_scalar_reference():
+    rng = random.Random(7)
+    industries, values = [], []
+    for _ in range(2000):
+        industry = rng.choice(list(emissions.INDUSTRY_DATA))
+        industries.append(industry)
+        values.append(tuple(rng.choice([rng.uniform(0, 6000), float(rng.randint(0, 5000)), 0.0]) for _ in range(4)))
+    batch = emissions.calculate_batch(industries, values)
+    assert batch == [emissions.calculate_emission_results(i, v) for i, v in zip(industries, values)]
+
+
+def test_matches_browser_calculator():
+    # Manufacturing at an average input of 1500: scale 1.5 -> 3750 + 2700 + 6300
+    result = emissions.calculate_batch(["manufacturing"], [(1000.0, 2000.0, 1500.0, 1500.0)])[0]
+    assert result["scaleFactor"] == 1.5
+    assert (result["scope1"], result["scope2"], result["scope3"]) == (3750, 2700, 6300)
+    assert result["totalEmissions"] == 12750
+    assert result["excessEmissions"] == 5250
+    assert result["creditCost"] == 447300
+    # Halves round up like Math.round: 2500 * 0.125 = 312.5
+    half = emissions.calculate_batch(["manufacturing"], [(125.0, 125.0, 125.0, 125.0)])[0]
+    assert half["scope1"] == 313
+    assert emissions.calculate_batch(["cement"], [(0.0, 0.0, 0.0, 0.0)])[0]["scaleFactor"] == emissions.MIN_SCALE
+
+
+def test_batch_endpoint_and_cache():
+    items = [_item("manufacturing", 1000, 2000, 1500, 1500), _item("power", 9000, 9000, 9000, 9000),
+             _item("manufacturing", 1000, 2000, 1500, 1500)]
+    r = client.post("/api/calculator/batch", json={"items": items})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 3
+    assert body["cache_hits"] == 0
+    assert body["results"][0] == body["results"][2]
+    assert body["results"][1]["scaleFactor"] == emissions.MAX_SCALE
+    assert body["totals"]["totalEmissions"] == sum(res["totalEmissions"] for res in body["results"])
+    assert len(emissions.result_cache) == 2
+
+    # Parameter order in the request does not matter for the cache key
+    reordered = {"industry": "manufacturing", "inputs": dict(reversed(list(items[0]["inputs"].items())))}
+    again = client.post("/api/calculator/batch", json={"items": [reordered]}).json()
+    assert again["cache_hits"] == 1
+    assert again["results"][0] == body["results"][0]
+
+
+@pytest.mark.parametrize("item", [
+    {"industry": "shipping", "inputs": {}},
+    {"industry": "steel", "inputs": {"raw_materials": 1}},
+    {"industry": "steel", "inputs": {"raw_materials": 1, "furnace_operations": 1, "electricity": 1,
+                                     "transportation": 1, "extra": 1}},
+])
+def test_batch_rejects_invalid_items(item):
+    r = client.post("/api/calculator/batch", json={"items": [_item("cement", 1, 2, 3, 4), item]})
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"][:3] == ["body", "items", 1]
+
+
+def test_batch_size_limit():
+    assert client.post("/api/calculator/batch", json={"items": []}).status_code == 422
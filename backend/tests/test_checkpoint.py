@@ -0,0 +1,104 @@
+# backend/tests/test_checkpoint.py
+import json
+import os
+import sys
+import time
+import pytest
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from routers import rewards
+import checkpoint
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "rewards_db.json")
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", path)
+    rewards.invalidate_rewards_cache()
+    yield path
+    rewards.invalidate_rewards_cache()
+
+
+def test_serialized_db_is_compact_json():
+    data = {"a": {"ecoPoints": 1, "note": "line\nbreak", "name": "Zoë"}, "b": {"ecoPoints": 2}}
+    payload = checkpoint.serialize_db(data)
+    assert json.loads(payload) == data
+    assert payload.startswith('{"a":{"ecoPoints":1,"note":"line\\nbreak","name":"Zoë"},'.encode("utf-8"))
+    assert json.loads(checkpoint.serialize_db({})) == {}
+
+
+def test_save_is_atomic_and_leaves_no_backup_or_temp_files(db_file, tmp_path):
+    rewards.save_rewards_db({"u1": {"ecoPoints": 5}})
+    rewards.save_rewards_db({"u1": {"ecoPoints": 6}})
+    names = os.listdir(tmp_path)
+    assert not [n for n in names if n.endswith(".tmp") or ".backup" in n]
+    with open(db_file, "rb") as f:
+        assert json.loads(f.read()) == {"u1": {"ecoPoints": 6}}
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_checkpoints_are_pruned_to_retention(db_file, compress):
+    for i in range(4):
+        rewards.save_rewards_db({"u1": {"ecoPoints": i}})
+        assert checkpoint.write_checkpoint(db_file, compress=compress, retain=2)
+    kept = checkpoint.list_checkpoints(db_file)
+    assert len(kept) == 2
+    assert all(p.endswith(".gz") == compress for p in kept)
+    assert checkpoint.load_checkpoint(kept[0]) == {"u1": {"ecoPoints": 3}}
+
+
+def test_corrupt_primary_is_restored_from_latest_checkpoint(db_file, tmp_path):
+    rewards.save_rewards_db({"u1": {"ecoPoints": 42}})
+    checkpoint.write_checkpoint(db_file)
+    with open(db_file, "w") as f:
+        f.write('{"u1": {"ecoPo')  # torn write from an older, non-atomic writer
+    rewards.invalidate_rewards_cache()
+
+    assert rewards.load_rewards_db() == {"u1": {"ecoPoints": 42}}
+    assert any(".backup." in n for n in os.listdir(tmp_path))
+    with open(db_file, "rb") as f:
+        assert json.loads(f.read()) == {"u1": {"ecoPoints": 42}}
+
+
+def test_missing_primary_is_restored_when_checkpoints_exist(db_file):
+    rewards.save_rewards_db({"u1": {"ecoPoints": 7}})
+    checkpoint.write_checkpoint(db_file)
+    os.unlink(db_file)
+    rewards.invalidate_rewards_cache()
+    assert rewards.load_rewards_db() == {"u1": {"ecoPoints": 7}}
+
+
+def test_checkpointer_policy_triggers_on_bytes_written(db_file):
+    rewards.save_rewards_db({"u1": {"ecoPoints": 1}})
+    checkpointer = checkpoint.Checkpointer(lambda: db_file, interval_seconds=3600, max_bytes=10)
+    assert not checkpointer._due()
+    checkpointer.notify_write(10)
+    deadline = time.time() + 5
+    while not checkpoint.list_checkpoints(db_file) and time.time() < deadline:
+        time.sleep(0.02)
+    assert len(checkpoint.list_checkpoints(db_file)) == 1
+    assert not checkpointer._due()
+
+
+def test_large_db_does_not_checkpoint_on_every_save(db_file):
+    rewards.save_rewards_db({"u1": {"ecoPoints": 1}})
+    checkpointer = checkpoint.Checkpointer(lambda: db_file, interval_seconds=3600, max_bytes=10,
+                                           min_interval_seconds=3600)
+    # Every save is bigger than the threshold, but only the first one checkpoints
+    checkpointer.notify_write(100)
+    deadline = time.time() + 5
+    while not checkpoint.list_checkpoints(db_file) and time.time() < deadline:
+        time.sleep(0.02)
+    for _ in range(5):
+        checkpointer.notify_write(100)
+        assert not checkpointer._due()
+    time.sleep(0.2)
+    assert len(checkpoint.list_checkpoints(db_file)) == 1
+
+    # Once the floor has passed, the bytes written since are checkpointed
+    checkpointer._last_checkpoint -= 3600
+    assert checkpointer._due()
@@ -0,0 +1,132 @@
+# backend/tests/test_compression.py
+import gzip
+import json
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+import compression
+import http_cache
+from routers import rewards
+
+client = TestClient(app)
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    rewards.rank_index.invalidate()
+    yield
+    rewards.invalidate_rewards_cache()
+
+
+def _award(user_id, action_type="carbon_offset", amount=1.0):
+    return rewards.update_rewards(rewards.UpdateRewardsRequest(user_id=user_id, action_type=action_type, amount=amount))
+
+
+def _seed(users=40):
+    for i in range(users):
+        _award(f"user-{i:03d}", amount=i + 1)
+
+
+def test_leaderboard_is_gzipped_and_revalidates_without_rebuilding(monkeypatch):
+    _seed()
+    plain = client.get("/api/rewards/leaderboard", headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+    etag = plain.headers["etag"]
+
+    compressed = client.get("/api/rewards/leaderboard", headers=GZIP)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == http_cache.with_encoding(etag, "gzip")
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 2
+    assert compressed.json() == plain.json()
+
+    # A matching tag in either coding is answered before the leaderboard is built
+    def fail(*args, **kwargs):
+        raise AssertionError("leaderboard rebuilt for a conditional hit")
+    with monkeypatch.context() as patched:
+        patched.setattr(rewards, "log_success", fail)
+        for tag in (etag, compressed.headers["etag"], f'W/{etag}, "other"'):
+            cached = client.get("/api/rewards/leaderboard", headers={**GZIP, "If-None-Match": tag})
+            assert cached.status_code == 304
+            assert cached.content == b""
+        assert client.get("/api/rewards/leaderboard", headers={**GZIP, "If-None-Match": compressed.headers["etag"]}) \
+            .headers["etag"] == compressed.headers["etag"]
+
+    # Limit is part of the tag, and any write moves it on
+    assert client.get("/api/rewards/leaderboard?limit=5", headers={"If-None-Match": etag}).status_code == 200
+    _award("user-000")
+    fresh = client.get("/api/rewards/leaderboard", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+
+
+def test_profile_etag_tracks_own_writes_and_position():
+    _seed(3)
+    first = client.get("/api/rewards/user/user-001")
+    etag = first.headers["etag"]
+    assert first.json()["position"] == 2
+    assert client.get("/api/rewards/user/user-001", headers={"If-None-Match": etag}).status_code == 304
+
+    # Another user overtaking changes this profile's position, and so its tag
+    _award("user-000", amount=10)
+    moved = client.get("/api/rewards/user/user-001", headers={"If-None-Match": etag})
+    assert moved.status_code == 200
+    assert moved.json()["position"] == 3
+    etag = moved.headers["etag"]
+
+    _award("user-001", "calculator_use")
+    assert rewards.load_rewards_db()["user-001"][rewards.VERSION_FIELD] == 3  # created, then two awards
+    updated = client.get("/api/rewards/user/user-001", headers={"If-None-Match": etag})
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != etag
+
+
+def test_small_streaming_and_encoded_responses_are_left_alone(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    admin = {**GZIP, "X-Admin-Token": "test-admin-token"}
+    _seed(2)
+    small = client.get("/health", headers=GZIP)
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    # Streaming exports pass through unbuffered; the gzip export is not encoded twice
+    stream = client.get("/api/rewards/export", headers=admin)
+    assert stream.status_code == 200
+    assert "content-encoding" not in stream.headers
+    assert len(stream.text.splitlines()) == 2
+    packed = client.get("/api/rewards/export?gzip=true", headers=admin)
+    assert "content-encoding" not in packed.headers
+    assert len(gzip.decompress(packed.content).splitlines()) == 2
+
+
+def test_negotiation():
+    assert compression.negotiate("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert compression.negotiate("gzip;q=0.5, br", ("br", "gzip")) == "br"
+    assert compression.negotiate("br;q=0, *", ("br", "gzip")) == "gzip"
+    assert compression.negotiate("gzip;q=0, identity", ("gzip",)) is None
+    assert compression.negotiate("", ("gzip",)) is None
+    assert compression.is_compressible("application/json")
+    assert compression.is_compressible("text/plain; version=0.0.4")
+    assert not compression.is_compressible("application/gzip")
+
+
+def test_brotli_when_available(monkeypatch):
+    pytest.importorskip("brotli")
+    _seed()
+    response = client.get("/api/rewards/leaderboard", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"].endswith('-br"')
+    assert json.loads(response.content)["success"] is True
@@ -0,0 +1,94 @@
+# backend/tests/test_export.py
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+from routers import rewards
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+DB = {
+    "alice": {
+        "ecoPoints": 60, "badges": ["water_warrior"], "rank": 1,
+        "actions": [
+            {"type": "carbon_offset", "amount": 1.0, "points_earned": 50, "timestamp": "2025-01-01T10:00:00", "metadata": {}},
+            {"type": "calculator_use", "amount": 1.0, "points_earned": 10, "timestamp": "2025-01-02T10:00:00", "metadata": {"tool": "water"}},
+        ],
+        "created_at": "2025-01-01T09:00:00", "updated_at": "2025-01-02T10:00:00",
+        "idempotency_keys": {"k": {"fingerprint": "x", "response": {}, "created_at": "2025-01-02T10:00:00"}},
+    },
+    "bob": {
+        "ecoPoints": 0, "badges": [], "rank": 0, "actions": [],
+        "created_at": "2025-03-01T09:00:00", "updated_at": "2025-03-01T09:00:00",
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def seeded_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    rewards.save_rewards_db(DB)
+    yield
+    rewards.invalidate_rewards_cache()
+
+
+def test_ndjson_export_streams_one_user_per_line():
+    r = client.get("/api/rewards/export?format=ndjson", headers=ADMIN)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert "X-Export-Snapshot-At" in r.headers
+    records = [json.loads(line) for line in r.text.splitlines()]
+    assert [rec["user_id"] for rec in records] == ["alice", "bob"]
+    assert len(records[0]["actions"]) == 2
+    assert "idempotency_keys" not in records[0]
+
+
+def test_csv_export_has_one_row_per_action():
+    r = client.get("/api/rewards/export?format=csv", headers=ADMIN)
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [(row["user_id"], row["action_type"]) for row in rows] == [
+        ("alice", "carbon_offset"), ("alice", "calculator_use"), ("bob", ""),
+    ]
+    assert json.loads(rows[1]["action_metadata"]) == {"tool": "water"}
+
+
+def test_gzip_and_updated_since_filter():
+    r = client.get("/api/rewards/export?format=ndjson&gzip=true&updated_since=2025-02-01T00:00:00", headers=ADMIN)
+    assert r.headers["content-type"] == "application/gzip"
+    assert r.headers["content-disposition"].endswith('.ndjson.gz"')
+    lines = gzip.decompress(r.content).decode("utf-8").splitlines()
+    assert [json.loads(line)["user_id"] for line in lines] == ["bob"]
+
+
+def test_invalid_parameters_are_rejected():
+    assert client.get("/api/rewards/export?format=xml", headers=ADMIN).status_code == 400
+    assert client.get("/api/rewards/export?updated_since=yesterday", headers=ADMIN).status_code == 400
+
+
+def test_export_requires_admin_token(monkeypatch):
+    assert client.get("/api/rewards/export").status_code == 401
+    assert client.get("/api/rewards/export", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    monkeypatch.delenv("ADMIN_TOKEN")
+    assert client.get("/api/rewards/export", headers=ADMIN).status_code == 403
+
+
+def test_incremental_export_resumes_from_snapshot_at():
+    first = client.get("/api/rewards/export", headers=ADMIN)
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id="carol", action_type="calculator_use"))
+    since = first.headers["X-Export-Snapshot-At"]
+    r = client.get(f"/api/rewards/export?updated_since={since}", headers=ADMIN)
+    assert [json.loads(line)["user_id"] for line in r.text.splitlines()] == ["carol"]
@@ -0,0 +1,85 @@
+# backend/tests/test_idempotency.py
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+from routers import rewards
+import idempotency
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    rewards.idempotency_store.clear()
+    yield
+    rewards.invalidate_rewards_cache()
+
+
+def _update(key, amount=1.0, user_id="retry-user"):
+    return client.post(
+        "/api/rewards/update",
+        json={"user_id": user_id, "action_type": "investment", "amount": amount},
+        headers={"Idempotency-Key": key} if key else {},
+    )
+
+
+def test_repeat_returns_original_response_without_adding_points():
+    first = _update("key-1")
+    assert first.status_code == 200
+    mtime = os.stat(rewards.REWARDS_DB_FILE).st_mtime_ns
+
+    repeat = _update("key-1")
+    assert repeat.status_code == 200
+    assert repeat.json() == first.json()
+    assert repeat.headers.get("Idempotent-Replayed") == "true"
+    assert os.stat(rewards.REWARDS_DB_FILE).st_mtime_ns == mtime
+
+    profile = client.get("/api/rewards/user/retry-user").json()
+    assert profile["ecoPoints"] == first.json()["points_earned"]
+
+
+def test_key_reuse_with_different_payload_is_rejected():
+    assert _update("key-2").status_code == 200
+    r = _update("key-2", amount=3.0)
+    assert r.status_code == 422
+    assert r.json()["detail"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+
+
+def test_replay_survives_restart_via_persisted_user_record():
+    first = _update("key-3")
+    rewards.idempotency_store.clear()  # simulate a fresh process
+    rewards.invalidate_rewards_cache()
+
+    repeat = _update("key-3")
+    assert repeat.json() == first.json()
+    assert client.get("/api/rewards/user/retry-user").json()["ecoPoints"] == first.json()["points_earned"]
+
+
+def test_requests_without_key_are_not_deduplicated():
+    _update(None)
+    _update(None)
+    assert client.get("/api/rewards/user/retry-user").json()["ecoPoints"] == 2 * rewards.ACTION_POINTS["investment"]
+
+
+def test_memory_store_is_bounded_and_ttl_evicting():
+    store = idempotency.IdempotencyStore(max_entries=2, ttl_seconds=60)
+    for i in range(3):
+        assert store.begin("u", f"k{i}", "fp") is None
+        store.complete("u", f"k{i}", "fp", {"n": i})
+    assert len(store) == 2
+    assert store.begin("u", "k2", "fp") == {"n": 2}
+
+    expired = idempotency.IdempotencyStore(max_entries=10, ttl_seconds=-1)
+    expired.begin("u", "k", "fp")
+    expired.complete("u", "k", "fp", {"n": 1})
+    assert expired.begin("u", "k", "fp") is None
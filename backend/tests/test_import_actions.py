@@ -0,0 +1,145 @@
+# backend/tests/test_import_actions.py
+import csv
+import gzip
+import json
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+import import_actions
+from routers import rewards
+
+client = TestClient(app)
+
+ACTIONS = [
+    ("alice", "carbon_offset", 2.0),
+    ("alice", "calculator_use", 1.0),
+    ("bob", "water_calculation", 1.0),
+] + [
+    ("alice", action_type, 1.0)
+    for i in range(130)
+    for action_type in [("calculator_use", "water_calculation", "carbon_offset", "energy_savings")[i % 4]]
+]
+
+
+@pytest.fixture
+def use_db(tmp_path, monkeypatch):
+    def switch(name):
+        monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / name))
+        rewards.invalidate_rewards_cache()
+    yield switch
+    rewards.invalidate_rewards_cache()
+
+
+def _write_ndjson(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for user_id, action_type, amount in rows:
+            f.write(json.dumps({"user_id": user_id, "action_type": action_type, "amount": amount}) + "\n")
+
+
+def test_import_matches_live_update_path(tmp_path, use_db):
+    use_db("live.json")
+    for user_id, action_type, amount in ACTIONS:
+        rewards.update_rewards(rewards.UpdateRewardsRequest(user_id=user_id, action_type=action_type, amount=amount))
+    live = rewards.load_rewards_db()
+
+    use_db("imported.json")
+    source = tmp_path / "actions.ndjson"
+    _write_ndjson(source, ACTIONS)
+    summary = import_actions.run_import([str(source)], checkpoint_after=False)
+    imported = rewards.load_rewards_db()
+
+    assert summary["written"] is True
+    assert summary["applied"] == len(ACTIONS)
+    assert set(imported) == set(live) == {"alice", "bob"}
+    for user_id in live:
+        for field in ("ecoPoints", "badges", "rank", "stats"):
+            assert imported[user_id][field] == live[user_id][field]
+        assert [a["type"] for a in imported[user_id]["actions"]] == [a["type"] for a in live[user_id]["actions"]]
+    assert len(imported["alice"]["badges"]) >= 3
+    assert len(imported["alice"]["actions"]) == rewards.MAX_ACTION_HISTORY
+
+
+def test_import_merges_existing_users_and_reports_skips(tmp_path, use_db):
+    use_db("rewards_db.json")
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id="carol", action_type="energy_savings"))
+
+    source = tmp_path / "actions.csv.gz"
+    with gzip.open(source, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id", "action_type", "amount", "timestamp", "metadata"])
+        writer.writerow(["carol", "carbon_offset", "1", "2024-05-01T12:00:00", '{"source": "partner"}'])
+        writer.writerow(["dave", "calculator_use", "", "", ""])
+        writer.writerow(["", "calculator_use", "1", "", ""])
+        writer.writerow(["erin", "not_a_type", "1", "", ""])
+        writer.writerow(["erin", "calculator_use", "-3", "", ""])
+        writer.writerow(["erin", "calculator_use", "1", "yesterday", ""])
+
+    summary = import_actions.run_import([str(source)], checkpoint_after=False)
+    assert summary["applied"] == 2
+    assert summary["new_users"] == 1
+    assert summary["skip_reasons"] == {
+        "missing_user_id": 1, "invalid_action_type": 1, "invalid_amount": 1, "invalid_timestamp": 1,
+    }
+
+    db = rewards.load_rewards_db()
+    carol = db["carol"]
+    assert carol["ecoPoints"] == rewards.ACTION_POINTS["energy_savings"] + rewards.ACTION_POINTS["carbon_offset"]
+    assert [a["type"] for a in carol["actions"]] == ["energy_savings", "carbon_offset"]
+    assert carol["actions"][-1]["metadata"] == {"source": "partner"}
+    assert db["dave"]["ecoPoints"] == rewards.ACTION_POINTS["calculator_use"]
+    assert "erin" not in db
+
+
+def test_invalid_existing_records_count_as_replaced_not_new(tmp_path, use_db):
+    use_db("rewards_db.json")
+    rewards.save_rewards_db({"carol": "not a record", "dave": None})
+    source = tmp_path / "actions.ndjson"
+    _write_ndjson(source, [(user_id, "calculator_use", 1) for user_id in ("carol", "dave", "erin")])
+
+    summary = import_actions.run_import([str(source)], checkpoint_after=False)
+    assert summary["new_users"] == 1
+    assert summary["replaced_records"] == 2
+    assert summary["total_users"] == len(rewards.load_rewards_db()) == 3
+    assert rewards.load_rewards_db()["carol"]["ecoPoints"] == rewards.ACTION_POINTS["calculator_use"]
+
+
+def test_imported_users_show_up_in_the_next_incremental_export(tmp_path, use_db, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    admin = {"X-Admin-Token": "test-admin-token"}
+    use_db("rewards_db.json")
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id="carol", action_type="energy_savings"))
+    before = rewards.load_rewards_db()["carol"]["updated_at"]
+    cursor = client.get("/api/rewards/export", headers=admin).headers["X-Export-Snapshot-At"]
+
+    source = tmp_path / "history.ndjson"
+    with open(source, "w", encoding="utf-8") as f:
+        for user_id in ("carol", "dave"):
+            f.write(json.dumps({"user_id": user_id, "action_type": "calculator_use",
+                                "timestamp": "2023-05-01T12:00:00"}) + "\n")
+    import_actions.run_import([str(source)], checkpoint_after=False)
+
+    r = client.get(f"/api/rewards/export?updated_since={cursor}", headers=admin)
+    exported = {record["user_id"]: record for record in map(json.loads, r.text.splitlines())}
+    assert sorted(exported) == ["carol", "dave"]
+    # Historical times stay on the actions; updated_at never moves backwards
+    assert exported["carol"]["updated_at"] > before
+    assert exported["carol"]["actions"][-1]["timestamp"] == "2023-05-01T12:00:00"
+    assert exported["dave"]["created_at"] == "2023-05-01T12:00:00"
+
+
+def test_dry_run_does_not_write(tmp_path, use_db):
+    use_db("rewards_db.json")
+    source = tmp_path / "actions.ndjson"
+    _write_ndjson(source, ACTIONS[:3])
+    summary = import_actions.run_import([str(source)], dry_run=True)
+    assert summary["written"] is False
+    assert summary["users_touched"] == 2
+    assert not os.path.exists(rewards.REWARDS_DB_FILE)
@@ -0,0 +1,126 @@
+# backend/tests/test_logging.py
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import pytest
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import logging_config
+
+
+def _record(level=logging.INFO, msg="hello", lineno=10, exc_info=None, **extra):
+    record = logging.LogRecord("test", level, "/app/x.py", lineno, msg, None, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_json_formatter_includes_extras_and_exception():
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record = _record(logging.ERROR, "failed", exc_info=sys.exc_info(), route="rewards.update", user_id="u1")
+    entry = json.loads(logging_config.JsonFormatter().format(record))
+    assert entry["level"] == "ERROR"
+    assert entry["message"] == "failed"
+    assert entry["route"] == "rewards.update" and entry["user_id"] == "u1"
+    assert entry["exc_type"] == "ValueError"
+    assert "Traceback" in entry["exc"]
+    assert entry["ts"].endswith("Z")
+
+
+def test_success_sampler_applies_per_route_rates(monkeypatch):
+    draws = iter([0.05, 0.5, 0.005, 0.5])
+    sampler = logging_config.SuccessSampler(0.1, {"rewards.update": 0.01, "health": 1.0}, rng=lambda: next(draws))
+    monkeypatch.setattr(logging_config, "_success_sampler", sampler)
+    emitted = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            emitted.append(record)
+
+    log = logging.getLogger("test.sampling")
+    log.addHandler(Capture())
+    log.setLevel(logging.INFO)
+    for route in ["rewards.leaderboard", "rewards.leaderboard", "rewards.update", "rewards.update", "health"]:
+        logging_config.log_success(log, route, "ok", user_id="u1")
+
+    assert [(r.route, getattr(r, "sample_rate", None)) for r in emitted] == [
+        ("rewards.leaderboard", 0.1), ("rewards.update", 0.01), ("health", None)]
+    assert emitted[0].user_id == "u1"
+
+
+def test_error_limiter_dedupes_per_call_site_and_reports_repeats():
+    clock = FakeClock()
+    limiter = logging_config.ErrorLimiter(window_seconds=60, rate=100, burst=100, clock=clock)
+    assert limiter.filter(_record(logging.ERROR)) is True
+    assert [limiter.filter(_record(logging.ERROR)) for _ in range(5)] == [False] * 5
+    assert limiter.filter(_record(logging.ERROR, lineno=11)) is True  # different call site
+    assert limiter.filter(_record(logging.INFO)) is True
+
+    clock.now = 61
+    again = _record(logging.ERROR)
+    assert limiter.filter(again) is True
+    assert again.repeated == 5
+
+
+def test_error_limiter_caps_distinct_errors():
+    clock = FakeClock()
+    limiter = logging_config.ErrorLimiter(window_seconds=60, rate=1, burst=3, clock=clock)
+    assert [limiter.filter(_record(logging.ERROR, lineno=i)) for i in range(5)] == [True] * 3 + [False] * 2
+    clock.now = 1
+    assert limiter.filter(_record(logging.ERROR, lineno=100)) is True
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = logging_config.NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = logging_config.LOG_RECORDS.value("INFO", "dropped")
+    handler.handle(_record())
+    handler.handle(_record())
+    assert handler.queue.qsize() == 1
+    assert logging_config.LOG_RECORDS.value("INFO", "dropped") == before + 1
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    sampler = logging_config._success_sampler
+    yield
+    logging_config.shutdown()
+    logging_config._success_sampler = sampler
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_configure_writes_json_lines_from_background_thread(restore_root_logger, monkeypatch):
+    monkeypatch.setenv("LOG_SUCCESS_SAMPLE_RATE", "1.0")
+    stream = io.StringIO()
+    assert logging_config.configure(fmt="json", stream=stream, force=True) is not None
+    assert logging_config.configure(stream=stream) is None  # already configured
+
+    log = logging.getLogger("routers.rewards")
+    logging_config.log_success(log, "rewards.update", "Rewards updated", points_earned=10)
+    log.warning("Slow %s", "disk")
+    logging_config.shutdown()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(l["level"], l["message"]) for l in lines] == [("INFO", "Rewards updated"), ("WARNING", "Slow disk")]
+    assert lines[0]["points_earned"] == 10
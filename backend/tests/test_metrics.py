@@ -0,0 +1,47 @@
+# backend/tests/test_metrics.py
+import os
+import sys
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+from routers import rewards
+import metrics
+
+client = TestClient(app)
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.05, "/a")
+    h.observe(0.5, "/a")
+    h.observe(5.0, "/a")
+    text = "\n".join(h.collect())
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+
+
+def test_metrics_endpoint_reports_routes_and_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+
+    r = client.post("/api/rewards/update", json={"user_id": "metrics-user", "action_type": "calculator_use"})
+    assert r.status_code == 200
+    client.get("/api/rewards/user/metrics-user")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'carbonx_http_requests_total{method="POST",route="/api/rewards/update",status="200"}' in body
+    assert 'route="/api/rewards/user/{user_id}"' in body
+    assert "carbonx_rewards_db_bytes_written_total" in body
+    assert "carbonx_rewards_db_lock_wait_seconds_count" in body
+    assert 'carbonx_cache_hit_ratio{cache="rewards_db"}' in body
+    assert 'carbonx_threadpool_tokens{state="capacity"}' in body
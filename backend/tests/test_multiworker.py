@@ -0,0 +1,71 @@
+# backend/tests/test_multiworker.py
+import os
+import subprocess
+import sys
+import pytest
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from routers import rewards
+import file_lock
+
+WORKER = """
+import sys
+from routers import rewards
+rewards.REWARDS_DB_FILE = sys.argv[1]
+for i in range(int(sys.argv[2])):
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id="shared-user", action_type="calculator_use"))
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id=f"user-{sys.argv[3]}-{i}", action_type="investment"))
+"""
+
+
+@pytest.mark.skipif(not file_lock.SUPPORTED, reason="cross-process locking needs fcntl")
+def test_concurrent_worker_processes_do_not_lose_updates(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "rewards_db.json")
+    processes, per_process = 4, 10
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, db_file, str(per_process), str(n)], cwd=ROOT,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for n in range(processes)
+    ]
+    assert all(w.wait(timeout=120) == 0 for w in workers)
+
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", db_file)
+    rewards.invalidate_rewards_cache()
+    db = rewards.load_rewards_db()
+    assert db["shared-user"]["ecoPoints"] == processes * per_process * rewards.ACTION_POINTS["calculator_use"]
+    assert len(db) == 1 + processes * per_process
+
+
+@pytest.mark.skipif(not file_lock.SUPPORTED, reason="cross-process locking needs fcntl")
+def test_cache_notices_writes_from_other_processes(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "rewards_db.json")
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", db_file)
+    rewards.invalidate_rewards_cache()
+    rewards.update_rewards(rewards.UpdateRewardsRequest(user_id="local", action_type="investment"))
+    assert "user-x-0" not in rewards.load_rewards_db()
+
+    subprocess.run([sys.executable, "-c", WORKER, db_file, "1", "x"], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    assert "user-x-0" in rewards.load_rewards_db()
+
+
+@pytest.mark.skipif(not file_lock.SUPPORTED, reason="cross-process locking needs fcntl")
+def test_generation_follows_a_recreated_lock_file(tmp_path):
+    lock_path = str(tmp_path / "rewards_db.json.lock")
+    assert file_lock.bump_generation(lock_path) == 1
+    assert file_lock.read_generation(lock_path) == 1
+
+    # A replaced lock file is read, not the orphaned inode the cached fd points at
+    os.remove(lock_path)
+    with open(lock_path, "wb") as f:
+        f.write((7).to_bytes(8, "little"))
+    assert file_lock.read_generation(lock_path) == 7
+    assert file_lock.bump_generation(lock_path) == 8
+
+    file_lock.release_generation_fds()
+    assert file_lock._generation_fds == {}
+    assert file_lock.read_generation(lock_path) == 8
@@ -0,0 +1,61 @@
+# backend/tests/test_profiler.py
+import os
+import sys
+import time
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+from profiler import profiler
+from routers import rewards
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+def test_admin_routes_require_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/profiler").status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    assert client.get("/api/admin/profiler", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.get("/api/admin/profiler", headers=ADMIN).status_code == 200
+
+
+def test_profiler_collects_collapsed_stacks(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    r = client.post("/api/admin/profiler/start", headers=ADMIN, json={"interval_ms": 1, "reset": True})
+    assert r.json()["profiling"] is True
+    deadline = time.time() + 0.2
+    while time.time() < deadline:
+        sum(i * i for i in range(1000))
+    client.post("/api/admin/profiler/stop", headers=ADMIN)
+
+    r = client.get("/api/admin/profiler/stacks", headers=ADMIN)
+    assert r.status_code == 200
+    assert "attachment" in r.headers["content-disposition"]
+    line = r.text.splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+
+def test_slow_requests_are_captured_with_span_breakdown(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    client.put("/api/admin/profiler/slow-requests", headers=ADMIN, json={"threshold_ms": 0.001})
+    try:
+        r = client.post("/api/rewards/update", json={"user_id": "slow-user", "action_type": "investment"})
+        assert r.status_code == 200
+        slow = client.get("/api/admin/profiler/slow-requests", headers=ADMIN).json()["slow_requests"]
+        update = next(s for s in slow if s["path"] == "/api/rewards/update")
+        assert "rewards.update" in update["spans"]
+        assert "rewards_db.write" in update["spans"]
+        r = client.get("/api/admin/profiler/slow-requests/0/stacks", headers=ADMIN)
+        assert r.status_code == 200
+    finally:
+        profiler.configure_slow_capture(threshold_ms=0)
+        profiler.slow_requests.clear()
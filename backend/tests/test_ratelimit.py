@@ -0,0 +1,100 @@
+# backend/tests/test_ratelimit.py
+import asyncio
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+from routers import rewards
+import ratelimit
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    ratelimit.user_limiter.clear()
+    ratelimit.ip_limiter.clear()
+    yield
+    ratelimit.user_limiter.clear()
+    ratelimit.ip_limiter.clear()
+    rewards.invalidate_rewards_cache()
+
+
+def test_token_bucket_refills_and_reports_retry_after():
+    limiter = ratelimit.TokenBucketLimiter("t", rate=1.0, burst=2.0)
+    assert limiter.acquire("k", now=0.0)[0]
+    assert limiter.acquire("k", now=0.0)[0]
+    allowed, retry_after = limiter.acquire("k", now=0.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert limiter.acquire("k", now=1.0)[0]
+
+
+def test_idle_buckets_are_evicted():
+    limiter = ratelimit.TokenBucketLimiter("t", rate=1.0, burst=1.0, idle_seconds=10, max_keys=3)
+    for i in range(3):
+        limiter.acquire(f"k{i}", now=0.0)
+    limiter.acquire("k3", now=1.0)
+    assert len(limiter) == 3  # capped
+    limiter.acquire("fresh", now=100.0)
+    assert len(limiter) == 1  # everything else idle
+
+
+def test_user_rate_limit_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(ratelimit, "user_limiter", ratelimit.TokenBucketLimiter("user", rate=0.1, burst=2))
+    body = {"user_id": "noisy-user", "action_type": "calculator_use"}
+    assert client.post("/api/rewards/update", json=body).status_code == 200
+    assert client.post("/api/rewards/update", json=body).status_code == 200
+    r = client.post("/api/rewards/update", json=body)
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "10"
+    assert r.json()["detail"]["code"] == "USER_RATE_LIMITED"
+    # Other users are unaffected
+    assert client.post("/api/rewards/update", json={**body, "user_id": "quiet-user"}).status_code == 200
+
+
+def test_idempotent_replays_are_not_rate_limited(monkeypatch):
+    monkeypatch.setattr(ratelimit, "user_limiter", ratelimit.TokenBucketLimiter("user", rate=0.1, burst=1))
+    body = {"user_id": "retrying-user", "action_type": "calculator_use"}
+    first = client.post("/api/rewards/update", json=body, headers={"Idempotency-Key": "once"})
+    assert first.status_code == 200
+    for _ in range(3):
+        replay = client.post("/api/rewards/update", json=body, headers={"Idempotency-Key": "once"})
+        assert replay.status_code == 200
+        assert replay.headers["Idempotent-Replayed"] == "true"
+    # A new key is a new request and pays for a token
+    r = client.post("/api/rewards/update", json=body, headers={"Idempotency-Key": "twice"})
+    assert r.status_code == 429
+    # ...and released its claim, so the retry is not reported as in progress
+    assert client.post("/api/rewards/update", json=body, headers={"Idempotency-Key": "twice"}).status_code == 429
+
+
+def test_global_concurrency_limit_sheds_with_503():
+    async def app_stub(scope, receive, send):
+        raise AssertionError("should have been shed")
+
+    middleware = ratelimit.AdmissionControlMiddleware(app_stub)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    limiter = ratelimit.concurrency_limiter
+    original = limiter.in_flight
+    limiter.in_flight = limiter.limit
+    try:
+        scope = {"type": "http", "path": "/api/rewards/leaderboard", "headers": [], "client": ("1.2.3.4", 1)}
+        asyncio.run(middleware(scope, None, send))
+    finally:
+        limiter.in_flight = original
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+    assert ratelimit.REQUESTS_SHED.value("overloaded") >= 1
@@ -0,0 +1,70 @@
+# backend/tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+import threading
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import main
+import startup
+
+client = TestClient(main.app)
+
+COLD_START = f"""
+import json, sys
+sys.path.insert(0, {ROOT!r})
+import main
+heavy_at_import = "numpy" in sys.modules
+from fastapi.testclient import TestClient
+with TestClient(main.app) as c:
+    main.warmup.wait(30)
+    r = c.get("/ready")
+    print(json.dumps({{"status": r.status_code, "body": r.json(), "heavy_at_import": heavy_at_import}}))
+"""
+
+
+def test_cold_start_warms_up_within_budget(tmp_path):
+    (tmp_path / "rewards_db.json").write_text('{"u1": {"ecoPoints": 5, "badges": [], "actions": []}}')
+    env = dict(os.environ, STARTUP_WARMUP="background", REWARDS_DB_FSYNC="false")
+    out = subprocess.run([sys.executable, "-c", COLD_START], cwd=tmp_path, env=env,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert result["heavy_at_import"] is False
+    assert result["status"] == 200
+    report = result["body"]["startup"]
+    assert report["state"] == "ready"
+    assert [step["name"] for step in report["steps"]] == ["rewards_db", "calculator"]
+    assert report["steps"][0]["detail"] == {"users": 1}
+    assert report["import_seconds"] > 0
+    assert report["within_budget"], report
+
+
+def test_ready_waits_for_warmup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "rewards_db.json").write_text("{}")
+    release = threading.Event()
+    fresh = startup.Warmup(budget_seconds=0)
+    fresh.add_step("slow", lambda: release.wait(10))
+    fresh.add_step("broken", lambda: 1 / 0)
+    monkeypatch.setattr(main, "warmup", fresh)
+
+    assert client.get("/ready").status_code == 200  # lifespan not started: nothing to wait for
+    fresh.start("background")
+    r = client.get("/ready")
+    assert r.status_code == 503
+    assert r.json()["checks"]["warmup"] == {"ok": False, "reason": "running"}
+    assert r.json()["startup"]["current_step"] == "slow"
+
+    release.set()
+    assert fresh.wait(10)
+    body = client.get("/ready").json()
+    assert body["status"] == "ready"
+    assert [(s["name"], s["ok"]) for s in body["startup"]["steps"]] == [("slow", True), ("broken", False)]
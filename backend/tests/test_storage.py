@@ -0,0 +1,168 @@
+# backend/tests/test_storage.py
+import json
+import os
+import sys
+import threading
+import pytest
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import storage
+from benchmarks import run
+
+
+@pytest.fixture(params=sorted(storage.BACKENDS))
+def store(request, tmp_path):
+    if request.param == "file":
+        path = str(tmp_path / "rewards_db.json")
+        return storage.FileStore(lambda: path)
+    return storage.MemoryStore()
+
+
+def _user(points, **fields):
+    return {"ecoPoints": points, "badges": [], "rank": 0, "actions": [], **fields}
+
+
+def test_get_put_and_versions(store):
+    assert store.get_user("alice") is None
+    assert store.count() == 0
+
+    stored = store.put_user("alice", _user(10))
+    assert stored["version"] == 1
+    assert store.get_user("alice") == stored
+    assert store.put_user("alice", _user(20))["version"] == 2
+    assert store.get_user("alice")["ecoPoints"] == 20
+    assert store.count() == 1
+
+
+def test_snapshots_are_copy_on_write(store):
+    store.put_user("alice", _user(10))
+    before = store.load()
+    version = store.version(before)
+    assert version is not None
+
+    store.put_user("bob", _user(5))
+    assert "bob" not in before
+    assert store.version(before) is None
+    assert store.version(store.load()) not in (None, version)
+
+
+def test_increment_points_is_atomic(store):
+    store.put_user("alice", _user(0))
+    threads = [threading.Thread(target=lambda: [store.increment_points("alice", 1) for _ in range(25)])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    user = store.get_user("alice")
+    assert user["ecoPoints"] == 100
+    assert user["version"] == 101
+    with pytest.raises(KeyError):
+        store.increment_points("nobody", 1)
+
+
+def test_append_action_keeps_bounded_history(store):
+    store.put_user("alice", _user(0))
+    for i in range(7):
+        length = store.append_action("alice", {"type": "calculator_use", "n": i}, max_history=5)
+    assert length == 5
+    assert [a["n"] for a in store.get_user("alice")["actions"]] == [2, 3, 4, 5, 6]
+
+
+def test_rank_queries(store):
+    for user_id, points in (("a", 10), ("b", 30), ("c", 10), ("d", 20)):
+        store.put_user(user_id, _user(points))
+    # Points descending, ties in insertion order (no badges here)
+    assert [user_id for user_id, _ in store.top(10)] == ["b", "d", "a", "c"]
+    assert store.position("c") == 4
+    assert store.position("missing") is None
+
+    store.increment_points("c", 25)
+    assert [user_id for user_id, _ in store.top(2)] == ["c", "b"]
+    assert store.top(0) == []
+
+    # A bulk save re-ranks everything
+    store.save({"x": _user(1), "y": _user(2)})
+    assert store.position("y") == 1
+    assert store.get_user("a") is None
+
+
+def test_health_and_describe(store):
+    store.put_user("alice", _user(1))
+    assert store.health() == {"ok": True, "reason": None}
+    assert store.describe()["backend"] == store.name
+
+
+def test_file_store_health_reports_missing_and_unreadable_files(tmp_path):
+    path = tmp_path / "rewards_db.json"
+    store = storage.FileStore(lambda: str(path))
+    assert store.health() == {"ok": False, "reason": "file_not_found"}
+    path.write_text("{not json")
+    assert store.health()["reason"].startswith("read_error")
+    path.write_text("[]")
+    assert store.health()["ok"] is False
+
+
+def test_memory_store_writes_in_place_without_copying_the_db(monkeypatch):
+    store = storage.MemoryStore({f"user-{i}": _user(i) for i in range(100)})
+    assert store.position("user-99") == 1
+
+    # Keyed writes and reads never take a whole-DB snapshot
+    def fail():
+        raise AssertionError("whole-DB snapshot taken")
+    with monkeypatch.context() as patched:
+        patched.setattr(store, "load", fail)
+        store.increment_points("user-0", 1000)
+        assert store.position("user-0") == 1
+        assert store.top(1)[0][0] == "user-0"
+        assert store.get_user("user-0")["version"] == 1
+
+    # A snapshot is copied once per write generation
+    snapshot = store.load()
+    assert store.load() is snapshot
+    store.put_user("user-1", _user(1))
+    assert store.load() is not snapshot
+
+
+def test_rank_index_never_rebuilds_back_to_a_stale_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "rewards_db.json")
+    store = storage.FileStore(lambda: path)
+    store.save({f"user-{i}": _user(i) for i in range(50)})
+    store.prepare()
+    rebuilds = []
+    rebuild = store.rank_index._rebuild
+    monkeypatch.setattr(store.rank_index, "_rebuild", lambda *args: rebuilds.append(args) or rebuild(*args))
+
+    # A reader that loaded its snapshot before a write is answered from the newer index
+    stale = store.load()
+    store.increment_points("user-0", 1000)
+    assert store.rank_index.position(stale, "user-0", store.version) == 1
+    assert store.rank_index.top(stale, 1, store.version)[0][1]["ecoPoints"] == 1000
+
+    # Another parse of the same file version is the same index
+    store._cache = (store._cache[0], dict(store._cache[1]))
+    assert store.position("user-0") == 1
+    store.increment_points("user-1", 2000)
+    assert [user_id for user_id, _ in store.top(2)] == ["user-1", "user-0"]
+    assert rebuilds == []
+
+
+def test_backends_compared_under_one_workload(tmp_path):
+    output = tmp_path / "results.json"
+    code = run.main([
+        "--sizes", "50", "--mode", "storage", "--duration", "0.01", "--min-iterations", "2",
+        "--cache-dir", str(tmp_path / "data"), "--output", str(output),
+    ])
+    assert code == 0
+    rows = json.loads(output.read_text())["results"]
+    by_mode = {}
+    for row in rows:
+        by_mode.setdefault(row["mode"], set()).add(row["op"])
+    assert set(by_mode) == {"store-memory", "store-file"}
+    assert by_mode["store-memory"] == by_mode["store-file"]
+    assert {"store_get_user", "store_increment_points", "store_position", "store_append_action"} <= by_mode["store-file"]
+    assert all(row["errors"] == 0 for row in rows)
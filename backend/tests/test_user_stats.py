@@ -0,0 +1,111 @@
+# backend/tests/test_user_stats.py
+import os
+import random
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import app
+import leaderboard
+from routers import rewards
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(rewards, "REWARDS_DB_FILE", str(tmp_path / "rewards_db.json"))
+    rewards.invalidate_rewards_cache()
+    rewards.rank_index.invalidate()
+    yield
+    rewards.invalidate_rewards_cache()
+
+
+def _award(user_id, action_type, amount=1.0):
+    return rewards.update_rewards(rewards.UpdateRewardsRequest(user_id=user_id, action_type=action_type, amount=amount))
+
+
+def _expected_position(user_id):
+    # Points, then badge count, descending; sorted() keeps insertion order for full ties
+    ordered = sorted(rewards.load_rewards_db().items(),
+                     key=lambda item: (item[1]["ecoPoints"], len(item[1]["badges"])), reverse=True)
+    return [uid for uid, _ in ordered].index(user_id) + 1
+
+
+def test_stats_cover_full_lifetime_not_just_retained_history():
+    for i in range(rewards.MAX_ACTION_HISTORY + 30):
+        _award("alice", "carbon_offset" if i % 2 else "calculator_use", 0.5)
+
+    body = client.get("/api/rewards/user/alice").json()
+    assert len(rewards.load_rewards_db()["alice"]["actions"]) == rewards.MAX_ACTION_HISTORY
+    assert body["stats"]["total_actions"] == 130
+    assert body["stats"]["carbon_offset_tons"] == 32.5
+    assert body["stats"]["by_type"]["calculator_use"] == {"count": 65, "amount": 32.5, "points": 65 * 5}
+    assert body["stats"]["by_type"]["carbon_offset"]["points"] == 65 * 25
+    assert body["stats"]["badge_count"] == len(body["badges"])
+    assert all("id" in badge for badge in body["badges"])
+
+
+def test_legacy_records_derive_stats_from_history():
+    rewards.save_rewards_db({
+        "legacy": {
+            "ecoPoints": 100, "badges": ["carbon_saver"], "rank": 1,
+            "actions": [{"type": "carbon_offset", "amount": 2.0, "points_earned": 100,
+                         "timestamp": "2025-01-01T00:00:00", "metadata": {}}],
+            "created_at": "2025-01-01T00:00:00", "updated_at": "2025-01-01T00:00:00",
+        }
+    })
+    body = client.get("/api/rewards/user/legacy").json()
+    assert body["stats"]["total_actions"] == 1
+    assert body["stats"]["carbon_offset_tons"] == 2.0
+    assert body["badges"][0]["id"] == "carbon_saver"
+
+    # The next write persists the derived stats plus the new action
+    _award("legacy", "carbon_offset", 1.0)
+    stored = rewards.load_rewards_db()["legacy"][rewards.STATS_FIELD]
+    assert stored["total_actions"] == 2
+    assert stored["carbon_offset_tons"] == 3.0
+
+
+def test_position_tracks_writes_and_external_replacement():
+    rng = random.Random(3)
+    users = [f"user-{i}" for i in range(12)]
+    for _ in range(60):
+        _award(rng.choice(users), rng.choice(["calculator_use", "investment", "water_calculation"]))
+        user_id = rng.choice(list(rewards.load_rewards_db()))
+        assert client.get(f"/api/rewards/user/{user_id}").json()["position"] == _expected_position(user_id)
+
+    # The leaderboard is read from the same index, so it agrees with every profile
+    board = client.get("/api/rewards/leaderboard?limit=5").json()
+    assert board["total_users"] == len(rewards.load_rewards_db())
+    assert [row["position"] for row in board["leaderboard"]] == [1, 2, 3, 4, 5]
+    for row in board["leaderboard"]:
+        assert _expected_position(row["user_id"]) == row["position"]
+
+    # A write that replaces the snapshot wholesale (another worker, a bulk import)
+    db = dict(rewards.load_rewards_db())
+    db["user-0"] = dict(db.get("user-0", {}), ecoPoints=10 ** 6)
+    rewards.save_rewards_db(db)
+    assert client.get("/api/rewards/user/user-0").json()["position"] == 1
+
+
+def test_rank_index_orders_ties_by_badges_then_insertion():
+    index = leaderboard.RankIndex()
+    snapshot = {"a": {"ecoPoints": 10}, "b": {"ecoPoints": 20}, "c": {"ecoPoints": 10}}
+    assert [index.position(snapshot, u) for u in "abc"] == [2, 1, 3]
+
+    updated = dict(snapshot, a={"ecoPoints": 5}, d={"ecoPoints": 10})
+    index.apply(snapshot, updated, ["a", "d"])
+    assert [index.position(updated, u) for u in "abcd"] == [4, 1, 2, 3]
+    assert index.position(updated, "missing") is None
+
+    # Equal points: more badges ranks first, as the leaderboard always has
+    badged = dict(updated, d={"ecoPoints": 10, "badges": ["first_step"]})
+    index.apply(updated, badged, ["d"])
+    assert [index.position(badged, u) for u in "abcd"] == [4, 1, 3, 2]
+    assert index.top(badged, 2)[1][0] == "d"